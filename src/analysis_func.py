@@ -1,99 +1,157 @@
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from metrics import timed
+
+# MACD parameters
+MACD_FAST_PERIOD = 12
+MACD_SLOW_PERIOD = 26
+MACD_SIGNAL_PERIOD = 9
+# Bollinger Bands parameters
+BB_TIMEPERIOD = 20
+BB_NBDEVUP = 2
+BB_NBDEVDN = 2
+# RSI parameters
+RSI_TIMEPERIOD = 14
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+MACD_NAME = "MACD"
+BB_NAME = "Bollinger Bands"
+RSI_NAME = "Relative Strength Index (RSI)"
+DESCRIPTIONS = {
+    MACD_NAME: "The MACD is a trend-following momentum indicator that shows the relationship between two moving averages of a stock's price. A bullish MACD indicates that the stock is likely to continue rising, while a bearish MACD indicates that the stock is likely to continue falling.",
+    BB_NAME: "Bollinger Bands are a technical analysis tool that uses moving averages and standard deviations to indicate overbought or oversold conditions in a stock. When the stock price is above the upper band, it is considered overbought, and when the stock price is below the lower band, it is considered oversold.",
+    RSI_NAME: "The Relative Strength Index (RSI) is a momentum indicator that measures the strength of a stock's price movement. A reading above 70 indicates that the stock is overbought and may be due for a correction, while a reading below 30 indicates that the stock is oversold and may be a good buying opportunity.",
+}
+RESULT_COLUMNS = ["Analysis", "Description", "Recommendation"]
+
+
+# Exponential moving average over the last axis (days), same as pandas ewm(span, adjust=False)
+def _ewm(values, span):
+    # pandas runs the recursion in C for every column at once, so the symbols are passed as columns
+    result = pd.DataFrame(np.atleast_2d(values).T).ewm(span=span, adjust=False).mean().to_numpy().T
+    return result.reshape(values.shape)
+
+
+# Rolling window over the last axis (days), NaN until the window is full like pandas rolling
+def _rolling(values, window, func):
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        result[..., window - 1:] = func(sliding_window_view(values, window, axis=-1), axis=-1)
+    return result
+
+
+def _macd(close):
+    # Calculate the fast and slow moving averages
+    fast_ma = _ewm(close, MACD_FAST_PERIOD)
+    slow_ma = _ewm(close, MACD_SLOW_PERIOD)
+    # Calculate the MACD line, its signal line and histogram
+    macd_line = fast_ma - slow_ma
+    macd_signal_line = _ewm(macd_line, MACD_SIGNAL_PERIOD)
+    return {'macd': macd_line, 'macd_signal': macd_signal_line, 'macd_hist': macd_line - macd_signal_line}
+
+
+def _bollinger(close):
+    # Calculate the rolling mean and standard deviation of the close prices
+    rolling_mean = _rolling(close, BB_TIMEPERIOD, np.mean)
+    rolling_std = _rolling(close, BB_TIMEPERIOD, lambda windows, axis: np.std(windows, axis=axis, ddof=1))
+    # Calculate the upper and lower Bollinger Bands
+    return {'bb_middle': rolling_mean,
+            'bb_upper': rolling_mean + BB_NBDEVUP * rolling_std,
+            'bb_lower': rolling_mean - BB_NBDEVDN * rolling_std}
 
-# MACD Analysis
-def func_macd (history):
-
-        # Calculate the MACD using the close prices
-        fast_period = 12
-        slow_period = 26
-        signal_period = 9
-        # Calculate the fast and slow moving averages
-        fast_ma = history["Close"].ewm(span=fast_period, adjust=False).mean()
-        slow_ma = history["Close"].ewm(span=slow_period, adjust=False).mean()
-        # Calculate the MACD line
-        macd_line = fast_ma - slow_ma
-        # Calculate the MACD signal line
-        macd_signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
-        # Calculate the MACD histogram
-        macd_hist = macd_line - macd_signal_line
-        # Create a table to store the results
-        results = pd.DataFrame(columns=["Analysis", "Description", "Recommendation"])
-        # Add a row to the table with the results of the MACD analysis
-        macd_results = pd.concat([results, pd.DataFrame({"Analysis": "MACD",
-                                                         "Description": "The MACD is a trend-following momentum indicator that shows the relationship between two moving averages of a stock's price. A bullish MACD indicates that the stock is likely to continue rising, while a bearish MACD indicates that the stock is likely to continue falling.",
-                                                         "Recommendation": "Buy" if list(macd_hist)[-1] > 0 else "Sell"}, index=[0])], ignore_index=True)
-        return macd_results
 
-# Bollinger Bands Analysis
-def bb_func(history):
+def _rsi(close):
+    # Calculate the difference between the current close price and the previous close price
+    diff = np.diff(close, axis=-1, prepend=np.nan)
+    # Calculate the up and down movements (the first day has no movement)
+    up_movements = np.where(diff > 0, diff, 0.0)
+    down_movements = np.where(diff < 0, -diff, 0.0)
+    # Calculate the average up and down movements over the past timeperiod periods
+    avg_up_movement = _rolling(up_movements, RSI_TIMEPERIOD, np.mean)
+    avg_down_movement = _rolling(down_movements, RSI_TIMEPERIOD, np.mean)
+    # Calculate the relative strength and the RSI
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_strength = avg_up_movement / avg_down_movement
+        rsi = 100 - (100 / (1 + relative_strength))
+    return {'rsi': rsi}
 
-    # Calculate the Bollinger Bands using the close prices
-    timeperiod = 20
-    nbdevup = 2
-    nbdevdn = 2
-    matype = 0
 
-    # Calculate the rolling mean and standard deviation of the close prices
-    rolling_mean = history["Close"].rolling(window=timeperiod).mean()
-    rolling_std = history["Close"].rolling(window=timeperiod).std()
+# All the indicators in one pass over a close prices array,
+# either one symbol (days,) or a batch of symbols (symbols x days) padded with leading NaN
+def compute_indicators(close):
+    close = np.asarray(close, dtype=np.float64)
+    return {**_macd(close), **_bollinger(close), **_rsi(close)}
 
-    # Calculate the upper and lower Bollinger Bands
-    upper_band = rolling_mean + nbdevup * rolling_std
-    lower_band = rolling_mean - nbdevdn * rolling_std
 
-    # Create a table to store the results
-    results = pd.DataFrame(columns=["Analysis", "Description", "Recommendation"])
+def _macd_signal(indicators):
+    return np.where(indicators['macd_hist'][..., -1] > 0, "Buy", "Sell")
 
-    # Add a row to the table with the results of the Bollinger Bands analysis
-    if list(history["Close"])[-1] > list(upper_band)[-1]:
-        recommendation = "Sell"
-    elif list(history["Close"])[-1] < list(lower_band)[-1]:
-        recommendation = "Buy"
-    else:
-        recommendation = "Hold"
 
-    bb_results = pd.concat([results, pd.DataFrame({"Analysis": "Bollinger Bands",
-                                                   "Description": "Bollinger Bands are a technical analysis tool that uses moving averages and standard deviations to indicate overbought or oversold conditions in a stock. When the stock price is above the upper band, it is considered overbought, and when the stock price is below the lower band, it is considered oversold.",
-                                                   "Recommendation": recommendation}, index=[0])], ignore_index=True)
-    return bb_results
+def _bb_signal(close, indicators):
+    last_close = close[..., -1]
+    return np.select([last_close > indicators['bb_upper'][..., -1], last_close < indicators['bb_lower'][..., -1]],
+                     ["Sell", "Buy"], "Hold")
 
 
-# RSI Analysis
-def rsi_func(history):
+def _rsi_signal(indicators):
+    last_rsi = indicators['rsi'][..., -1]
+    return np.select([last_rsi > RSI_OVERBOUGHT, last_rsi < RSI_OVERSOLD], ["Sell", "Buy"], "Hold")
 
-    # Calculate the RSI using the close prices
-    timeperiod = 14
 
-    # Calculate the difference between the current close price and the previous close price
-    diff = history["Close"].diff()
+# Latest Buy/Sell/Hold of every analysis, a string per analysis (or an array of them for a batch)
+@timed('indicators')
+def latest_signals(close, indicators=None):
+    close = np.asarray(close, dtype=np.float64)
+    if indicators is None:
+        indicators = compute_indicators(close)
+    signals = {MACD_NAME: _macd_signal(indicators),
+               BB_NAME: _bb_signal(close, indicators),
+               RSI_NAME: _rsi_signal(indicators)}
+    if close.ndim == 1:
+        signals = {name: str(signal) for name, signal in signals.items()}
+    return signals
 
-    # Calculate the up and down movements
-    up_movements = diff.where(diff > 0, 0)
-    down_movements = diff.where(diff < 0, 0)
 
-    # Calculate the average up and down movements over the past timeperiod periods
-    avg_up_movement = up_movements.rolling(timeperiod).mean()
-    avg_down_movement = down_movements.rolling(timeperiod).mean().abs()
+# Analysis results table from the signals of every analysis
+def recommendations_table(signals):
+    return pd.DataFrame([{"Analysis": name, "Description": DESCRIPTIONS[name], "Recommendation": recommendation}
+                         for name, recommendation in signals.items()], columns=RESULT_COLUMNS)
+
+
+def _close_array(history):
+    return history["Close"].to_numpy(dtype=np.float64)
+
+
+# All the analysis results tables of a history
+def recommendations(history):
+    return recommendations_table(latest_signals(_close_array(history)))
+
+
+# MACD Analysis
+def func_macd(history):
+    close = _close_array(history)
+    return recommendations_table({MACD_NAME: str(_macd_signal(_macd(close)))})
 
-    # Calculate the relative strength
-    relative_strength = avg_up_movement / avg_down_movement
 
-    # Calculate the RSI
-    rsi = 100 - (100 / (1 + relative_strength))
+# Bollinger Bands Analysis
+def bb_func(history):
+    close = _close_array(history)
+    return recommendations_table({BB_NAME: str(_bb_signal(close, _bollinger(close)))})
 
-    # Create a table to store the results
-    results = pd.DataFrame(columns=["Analysis", "Description", "Recommendation"])
 
-    # Add a row to the table with the results of the RSI analysis
-    if list(rsi)[-1] > 70:
-        recommendation = "Sell"
-    elif list(rsi)[-1] < 30:
-        recommendation = "Buy"
-    else:
-        recommendation = "Hold"
+# RSI Analysis
+def rsi_func(history):
+    close = _close_array(history)
+    return recommendations_table({RSI_NAME: str(_rsi_signal(_rsi(close)))})
 
 
-    rsi_results = pd.concat([results, pd.DataFrame({"Analysis": "Relative Strength Index (RSI)",
-                                                    "Description": "The Relative Strength Index (RSI) is a momentum indicator that measures the strength of a stock's price movement. A reading above 70 indicates that the stock is overbought and may be due for a correction, while a reading below 30 indicates that the stock is oversold and may be a good buying opportunity.",
-                                                    "Recommendation": recommendation}, index=[0])], ignore_index=True)
-    return rsi_results
+# Parameters and descriptions of the analyses, for the clientside recommendations (assets/charts.js)
+def client_config():
+    return {'macd': [MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD],
+            'bb': [BB_TIMEPERIOD, BB_NBDEVUP, BB_NBDEVDN],
+            'rsi': [RSI_TIMEPERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD],
+            'names': [MACD_NAME, BB_NAME, RSI_NAME],
+            'descriptions': DESCRIPTIONS}
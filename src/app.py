@@ -1,69 +1,65 @@
 import dash
 from dash import dash_table
+from dash.dash_table.FormatTemplate import percentage
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import datetime
-import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 import base64
-import yfinance as yf
 import dash_auth
-from stocks_import import indexes, df_symbols, df_industries
-from tables_styles import style_table, style_cell, style_data, style_header, style_data_conditional_for_recomm
-from analysis_func import func_macd, bb_func, rsi_func
+from stocks_import import indexes
+from tables_styles import style_table, style_cell, style_data, style_header, style_data_conditional_for_recomm, \
+    style_data_conditional_for_screener, style_data_conditional_for_backtest, style_data_conditional_for_peers
+from analysis_func import RESULT_COLUMNS, client_config, recommendations_table
+from batch_signals import SIGNAL_COLUMNS, read_signals
+from server_store import get_history_range, get_symbol_arrays, load_symbol_histories, symbol_history_data
+from catalog_index import MAIN_TABLE_COLUMNS, get_catalog_index
+from table_query import query_table
+from charts import build_comparison_figure, chart_config
+from prefetch import get_scheduler
+from backtest import BACKTEST_COLUMNS, backtest_records
+from memo_cache import backtest_cache
+from peers import PEER_COLUMNS, peer_records
+from price_store import get_history
+from streaming_indicators import update_symbol_state
+from config import CHART_MAX_POINTS, COMPARE_MAX_SYMBOLS, HISTORY_YEARS, LIVE_REFRESH_SECONDS, PEER_WINDOW_DAYS
+from metrics import init_app, timed
+from data_api import init_api
 
 # Login
 VALID_USERNAME_PASSWORD_PAIRS = [['naya', 'naya']]
 app = dash.Dash(__name__, title='Stock App', external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
 auth = dash_auth.BasicAuth(app, VALID_USERNAME_PASSWORD_PAIRS)
+# Timings: /metrics and Server-Timing headers (registered after the login, which only protects the Dash views)
+init_app(server)
+# Read-only data API (/api/v1/...), behind the same login
+init_api(server, auth)
+
+# Date range picker over the stored history window up to today, the first symbol history is only loaded by
+# its callback; built with each layout, a worker started on an earlier day would keep showing its start day
+def date_range_picker():
+    history_end = datetime.date.today()
+    history_start = (pd.Timestamp(history_end) - pd.DateOffset(years=HISTORY_YEARS)).date()
+    return dcc.DatePickerRange(
+        id='date-range-picker',
+        display_format="D-M-Y",
+        start_date=history_start,
+        end_date=history_end,
+        start_date_placeholder_text='Start date',
+        end_date_placeholder_text='End date',
+        min_date_allowed=history_start,
+        max_date_allowed=history_end,
+        initial_visible_month=history_start,
+        persistence=True,
+        persistence_type='session',
+        calendar_orientation='horizontal',
+        style={'width': '90%'}
+    )
 
-msft = yf.Ticker('AZN')
-history_range = msft.history(period="5y")
-df_history = history_range.reset_index(drop=False)
-df_history['Date'] = pd.to_datetime(df_history['Date']).dt.date
-first_open = df_history['Open'].iloc[0]
-# Get the last close price
-last_close = df_history['Close'].iloc[-1]
-# Compare the first open price to the last close price
-if first_open < last_close:
-    fill_color = 'green'
-else:
-    fill_color = 'red'
-
-# MACD Analysis
-macd_results = func_macd(df_history)
-# Bollinger Bands Analysis
-bb_results = bb_func(df_history)
-# RSI Analysis
-rsi_results = rsi_func(df_history)
-# Append Analysis Results Tables
-recomm_df = pd.concat([macd_results, bb_results, rsi_results])
-
-
-selected_ind = list(df_industries[df_industries['Symbol'] == 'AZN']['Industries'])
-selected_ind_symbol = list(df_industries[df_industries['Industries'].isin(selected_ind)]['Symbol'].unique())
-df_second_table = df_symbols[df_symbols['Symbol'].isin(selected_ind_symbol)].reset_index(drop=True)
-df_second_table = df_second_table[['Symbol', 'Company Name', 'Country']]
-
-range_slicer = dcc.DatePickerRange(
-    id='date-range-picker',
-    display_format="D-M-Y",
-    start_date=df_history['Date'].min(),
-    end_date=df_history['Date'].max(),
-    start_date_placeholder_text='Start date',
-    end_date_placeholder_text='End date',
-    min_date_allowed=df_history['Date'].min(),
-    max_date_allowed=df_history['Date'].max(),
-    initial_visible_month=df_history['Date'].min(),
-    persistence=True,
-    persistence_type='session',
-    calendar_orientation='horizontal',
-    style={'width': '90%'}
-)
 
 charts_filter = dcc.RadioItems(
     id='filter-charts',
@@ -75,6 +71,17 @@ charts_filter = dcc.RadioItems(
     style={'font-family': 'roboto', 'font-size': 20}
 )
 
+# Live mode: append the newest bars to the chart and signals every LIVE_REFRESH_SECONDS
+live_mode = dcc.Checklist(
+    id='live-mode',
+    options=[{'label': 'Live', 'value': 'live'}],
+    value=[],
+    labelStyle={'margin': '10px'},
+    style={'font-family': 'roboto', 'font-size': 20}
+)
+
+live_interval = dcc.Interval(id='live-interval', interval=LIVE_REFRESH_SECONDS * 1000, disabled=True)
+
 index_dropdown = dcc.Dropdown(
                                 id='index-dropdown',
                                 options=[{'label': index, 'value': index} for index in indexes],
@@ -84,21 +91,37 @@ index_dropdown = dcc.Dropdown(
                                 style={'font-size': 15, 'font-family': 'roboto'}
                             )
 
+# Its options come from the server search as the user types (update_symbol_options)
 symbol_dropdown = dcc.Dropdown(
                                 id='symbol-dropdown',
-                                options=[{'label': symbol, 'value': symbol} for symbol
-                                         in df_symbols['Symbol'].unique()],
-                                value=df_symbols['Symbol'][df_symbols['Stock Index'] == 'NASDAQ 100'].unique()[0],
-                                placeholder="Search Stock by selected index",
+                                options=get_catalog_index().search_options('NASDAQ 100', None),
+                                value=get_catalog_index().symbol_options('NASDAQ 100')[0]['value'],
+                                placeholder="Search Stock by symbol or company name",
+                                searchable=True,
+                                style={'font-size': 15, 'font-family': 'roboto'}
+                            )
+
+# Symbols overlaid with the selected one on the comparison chart
+compare_dropdown = dcc.Dropdown(
+                                id='compare-dropdown',
+                                multi=True,
+                                placeholder=f"Compare with up to {COMPARE_MAX_SYMBOLS - 1} stocks",
                                 searchable=True,
                                 style={'font-size': 15, 'font-family': 'roboto'}
                             )
 
 main_table = dash_table.DataTable(
                                     id='stock-table',
-                                    columns=[{'name': col, 'id': col} for col
-                                             in df_symbols.sort_values(by=['Symbol']).columns],
+                                    columns=[{'name': col, 'id': col} for col in MAIN_TABLE_COLUMNS],
                                     page_size=12,
+                                    # Only the visible page is sent, sorted and filtered on the server
+                                    page_current=0,
+                                    page_action='custom',
+                                    sort_action='custom',
+                                    sort_mode='multi',
+                                    sort_by=[],
+                                    filter_action='custom',
+                                    filter_query='',
                                     fill_width=True,
                                     fixed_rows={'headers': False},
                                     style_table=style_table,
@@ -116,9 +139,16 @@ main_table = dash_table.DataTable(
 
 second_table = dash_table.DataTable(
                             id='industries-table',
-                            columns=[{'name': col, 'id': col} for col in
-                                     df_second_table.sort_values(by=['Symbol']).columns],
+                            columns=[{'name': col, 'id': col} for col in ['Symbol', 'Company Name', 'Country']],
                             page_size=11,
+                            # Only the visible page is sent, sorted and filtered on the server
+                            page_current=0,
+                            page_action='custom',
+                            sort_action='custom',
+                            sort_mode='multi',
+                            sort_by=[],
+                            filter_action='custom',
+                            filter_query='',
                             fill_width=True,
                             fixed_rows={'headers': False},
                             style_table=style_table,
@@ -137,8 +167,7 @@ second_table = dash_table.DataTable(
 
 recommend_table = dash_table.DataTable(
                             id='recommend-table',
-                            columns=[{'name': col, 'id': col} for col in recomm_df.columns],
-                            data=macd_results.to_dict('records'),
+                            columns=[{'name': col, 'id': col} for col in RESULT_COLUMNS],
                             # page_size=11,
                             fill_width=True,
                             fixed_rows={'headers': False},
@@ -158,258 +187,569 @@ recommend_table = dash_table.DataTable(
 
 )
 
+# How the rules would have done over the stored history, with their best parameters
+backtest_table = dash_table.DataTable(
+                            id='backtest-table',
+                            columns=[{'name': col, 'id': col, 'type': 'numeric', 'format': percentage(1)}
+                                     if col in ['Hit Rate', 'Return', 'Max Drawdown', 'Best Return']
+                                     else {'name': col, 'id': col} for col in BACKTEST_COLUMNS],
+                            fill_width=True,
+                            fixed_rows={'headers': False},
+                            style_table=style_table,
+                            style_data=style_data,
+                            style_cell=style_cell,
+                            style_header=style_header,
+                            style_data_conditional=style_data_conditional_for_backtest
+)
+
+# The selected stock against the other stocks of its industries (all indexes)
+peers_table = dash_table.DataTable(
+                            id='peers-table',
+                            columns=[{'name': col, 'id': col, 'type': 'numeric', 'format': percentage(1)}
+                                     if col in ['Return', 'Relative Performance']
+                                     else {'name': col, 'id': col, 'type': 'numeric'}
+                                     if col in ['Correlation', 'Beta']
+                                     else {'name': col, 'id': col} for col in PEER_COLUMNS],
+                            page_size=12,
+                            sort_action='native',
+                            fill_width=True,
+                            fixed_rows={'headers': False},
+                            style_table=style_table,
+                            style_data=style_data,
+                            style_cell=style_cell,
+                            style_header=style_header,
+                            style_data_conditional=style_data_conditional_for_peers
+)
+
+# Signals of every stock of the index, computed by batch_signals.py
+screener_table = dash_table.DataTable(
+                            id='screener-table',
+                            columns=[{'name': col, 'id': col} for col in
+                                     ['Symbol', 'Company Name', 'Last Close', 'Date'] + list(SIGNAL_COLUMNS.values())],
+                            page_size=12,
+                            sort_action='native',
+                            fill_width=True,
+                            fixed_rows={'headers': False},
+                            style_table=style_table,
+                            style_data=style_data,
+                            style_cell=style_cell,
+                            style_header=style_header,
+                            style_data_conditional=style_data_conditional_for_screener
+)
+
 logo_png = 'stock-market-image.png'
 logo_base64 = base64.b64encode(open(logo_png, 'rb').read()).decode('ascii')
 
-# Define the layout of the app
-app.layout = html.Div([
-    # Row 1
-    dbc.Row([
-        # Row 1 - Col 1
-        dbc.Col([html.Img(src='data:image/png;base64,{}'.format(logo_base64), style={'height': '90%',
-                                                                                     'width': '40%',
-                                                                                     'margin-top': 20})], width=3),
-        # Row 1 - Col 2
-        dbc.Col([
+# Layout of the app, built for every page load so the dates follow the current day
+def serve_layout():
+    return html.Div([
+        # Row 1
+        dbc.Row([
+            # Row 1 - Col 1
+            dbc.Col([html.Img(src='data:image/png;base64,{}'.format(logo_base64), style={'height': '90%',
+                                                                                         'width': '40%',
+                                                                                         'margin-top': 20})], width=3),
+            # Row 1 - Col 2
+            dbc.Col([
+                    html.Div([
+                        html.H3('Stock Market Overview', style={'text-align': 'center', 'font-family': 'roboto',
+                                                                'fontSize': 40, 'color': '#2c3e50'}),
+                        html.H5('💰Naya Python Middle Project💰', style={'text-align': 'center', 'font-family': 'roboto',
+                                                                     'fontSize': 15}),
+                    ])
+                    ], style={'font-weight': 'bold', 'font-family': 'sans-serif', 'fontSize': 40}, width=3),
+
+            # Row 1 - Col 3
+            dbc.Col([], width=2),
+            # Row 1 - Col 4
+            dbc.Col([
+                html.Div([
+                    html.H1('Select Stock Market Index', style={'text-align': 'center',
+                                                                'backgroundColor': '#2c3e50',
+                                                                'color': '#ffffff',
+                                                                'font-family': 'roboto',
+                                                                'fontSize': 15}),
+                    index_dropdown])
+            ], width=2),
+            # Row 1 - Col 5
+            dbc.Col([
+                html.Div([
+                    html.H1('Select Ticker in the selected index', style={'text-align': 'center',
+                                                                          'backgroundColor': '#2c3e50',
+                                                                          'color': '#ffffff',
+                                                                          'font-family': 'roboto',
+                                                                          'fontSize': 15}),
+                    symbol_dropdown])
+            ], width=2),
+        ], justify="center", className="h-10", style={'margin-bottom': 10,
+                                                      'margin-top': 5,
+                                                      'margin-left': 10,
+                                                      'margin-right': 10}),
+        # Row 2
+        # dbc.Row([html.Hr(style={'backgroundColor': '#2c3e50', 'height': '2px', 'border': 'none'})
+        #          ], style={'margin-bottom': 2,
+        #                    'margin-top': 5,
+        #                    'margin-left': 10,
+        #                    'margin-right': 10}),
+
+        # Row 2
+        dbc.Row([
+            html.H1(id='main_header', style={'text-align': 'center', 'font-family': 'roboto',
+                                             'fontSize': 20, 'backgroundColor': '#ffffff',
+                                             'color': 'red'}),
+        ], style={'margin-bottom': 5}),
+        # Row 3
+        dbc.Row([
+            # Row 3 - Col 1
+            dbc.Col([
                 html.Div([
-                    html.H3('Stock Market Overview', style={'text-align': 'center', 'font-family': 'roboto',
-                                                            'fontSize': 40, 'color': '#2c3e50'}),
-                    html.H5('💰Naya Python Middle Project💰', style={'text-align': 'center', 'font-family': 'roboto',
-                                                                 'fontSize': 15}),
+                    html.H1(id='header_1', style={'text-align': 'center', 'font-family': 'roboto',
+                                                                'fontSize': 15, 'backgroundColor': '#2c3e50',
+                                                                'color': '#ffffff',  'fontWeight': 'bold'}),
+                    second_table
+                    ])
+            ], width=4),
+            # Row 3 - Col 2
+            dbc.Col([
+                # Row 3 - Col 1 - Row 1
+                dbc.Row([
+                    # Row 3 - Col 1 - Row 1 - Col 1
+                    dbc.Col([live_mode, live_interval], width=2),
+                    dbc.Col([charts_filter], width=4),
+                    dbc.Col([], width=2),
+                    # Row 3 - Col 1 - Row 1 - Col 2
+                    dbc.Col([date_range_picker()], width=4)
+                ], justify="center"),
+                # Row 3 - Col 1 - Row 2
+                dbc.Row([dcc.Graph(id='chart')]),
+                # Row 3 - Col 1 - Row 3
+                dbc.Row([dbc.Col([compare_dropdown], width=12)]),
+                dbc.Row([html.Div(id='compare-note', style={'font-family': 'roboto', 'color': 'tomato'})]),
+                dbc.Row([dcc.Graph(id='compare-chart')])
+            ], width=8),
+        ], style={'margin-left': 10}),
+        # Row 4
+        dbc.Row([html.Hr(style={'backgroundColor': '#2c3e50', 'height': '1px'})
+                 ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10}),
+        # Row 5
+        dbc.Row([
+            # Row 5 - Col 1
+            dbc.Col([
+                html.Div([
+                    html.H1(id='header_2', style={'text-align': 'center', 'font-family': 'roboto',
+                                                                'fontSize': 15, 'backgroundColor': '#2c3e50',
+                                                                'color': '#ffffff',  'fontWeight': 'bold'}),
+                    main_table
+                ])
+            ], width=4),
+            # Row 5 - Col 2
+            # dbc.Col([], width=1),
+            # Row 5 - Col 3
+            dbc.Col([
+                html.Div([
+                    html.H1(id='header_3', style={'text-align': 'center', 'font-family': 'roboto',
+                                                                'fontSize': 15, 'backgroundColor': '#2c3e50',
+                                                                'color': '#ffffff',  'fontWeight': 'bold'}),
+                    recommend_table,
+                    html.H1(f'Backtest of the Rules over {HISTORY_YEARS} Years',
+                            style={'text-align': 'center', 'font-family': 'roboto', 'fontSize': 15,
+                                   'backgroundColor': '#2c3e50', 'color': '#ffffff', 'fontWeight': 'bold',
+                                   'margin-top': 10}),
+                    backtest_table
+                ])
+            ], width=8),
+                 ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10}),
+        # Row 6
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H1(id='header_4', style={'text-align': 'center', 'font-family': 'roboto',
+                                                  'fontSize': 15, 'backgroundColor': '#2c3e50',
+                                                  'color': '#ffffff', 'fontWeight': 'bold'}),
+                    screener_table
                 ])
-                ], style={'font-weight': 'bold', 'font-family': 'sans-serif', 'fontSize': 40}, width=3),
-
-        # Row 1 - Col 3
-        dbc.Col([], width=2),
-        # Row 1 - Col 4
-        dbc.Col([
-            html.Div([
-                html.H1('Select Stock Market Index', style={'text-align': 'center',
-                                                            'backgroundColor': '#2c3e50',
-                                                            'color': '#ffffff',
-                                                            'font-family': 'roboto',
-                                                            'fontSize': 15}),
-                index_dropdown])
-        ], width=2),
-        # Row 1 - Col 5
-        dbc.Col([
-            html.Div([
-                html.H1('Select Ticker in the selected index', style={'text-align': 'center',
-                                                                      'backgroundColor': '#2c3e50',
-                                                                      'color': '#ffffff',
-                                                                      'font-family': 'roboto',
-                                                                      'fontSize': 15}),
-                symbol_dropdown])
-        ], width=2),
-    ], justify="center", className="h-10", style={'margin-bottom': 10,
-                                                  'margin-top': 5,
-                                                  'margin-left': 10,
-                                                  'margin-right': 10}),
-    # Row 2
-    # dbc.Row([html.Hr(style={'backgroundColor': '#2c3e50', 'height': '2px', 'border': 'none'})
-    #          ], style={'margin-bottom': 2,
-    #                    'margin-top': 5,
-    #                    'margin-left': 10,
-    #                    'margin-right': 10}),
-
-    # Row 2
-    dbc.Row([
-        html.H1(id='main_header', style={'text-align': 'center', 'font-family': 'roboto',
-                                         'fontSize': 20, 'backgroundColor': '#ffffff',
-                                         'color': 'red'}),
-    ], style={'margin-bottom': 5}),
-    # Row 3
-    dbc.Row([
-        # Row 3 - Col 1
-        dbc.Col([
-            html.Div([
-                html.H1(id='header_1', style={'text-align': 'center', 'font-family': 'roboto',
-                                                            'fontSize': 15, 'backgroundColor': '#2c3e50',
-                                                            'color': '#ffffff',  'fontWeight': 'bold'}),
-                second_table
+            ], width=12),
+        ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10}),
+        # Row 7
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H1(id='header_5', style={'text-align': 'center', 'font-family': 'roboto',
+                                                  'fontSize': 15, 'backgroundColor': '#2c3e50',
+                                                  'color': '#ffffff', 'fontWeight': 'bold'}),
+                    peers_table
                 ])
-        ], width=4),
-        # Row 3 - Col 2
-        dbc.Col([
-            # Row 3 - Col 1 - Row 1
-            dbc.Row([
-                # Row 3 - Col 1 - Row 1 - Col 1
-                dbc.Col([], width=2),
-                dbc.Col([charts_filter], width=4),
-                dbc.Col([], width=2),
-                # Row 3 - Col 1 - Row 1 - Col 2
-                dbc.Col([range_slicer], width=4)
-            ], justify="center"),
-            # Row 3 - Col 1 - Row 2
-            dbc.Row([dcc.Graph(id='chart')])
-        ], width=8),
-    ], style={'margin-left': 10}),
-    # Row 4
-    dbc.Row([html.Hr(style={'backgroundColor': '#2c3e50', 'height': '1px'})
-             ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10}),
-    # Row 5
-    dbc.Row([
-        # Row 5 - Col 1
-        dbc.Col([
-            html.Div([
-                html.H1(id='header_2', style={'text-align': 'center', 'font-family': 'roboto',
-                                                            'fontSize': 15, 'backgroundColor': '#2c3e50',
-                                                            'color': '#ffffff',  'fontWeight': 'bold'}),
-                main_table
-            ])
-        ], width=4),
-        # Row 5 - Col 2
-        # dbc.Col([], width=1),
-        # Row 5 - Col 3
-        dbc.Col([
-            html.Div([
-                html.H1(id='header_3', style={'text-align': 'center', 'font-family': 'roboto',
-                                                            'fontSize': 15, 'backgroundColor': '#2c3e50',
-                                                            'color': '#ffffff',  'fontWeight': 'bold'}),
-                recommend_table
-            ])
-        ], width=8),
-             ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10})
-])
-# Define the callback function to update the table based on the selected index
+            ], width=12),
+        ], style={'margin-bottom': 10, 'margin-left': 10, 'margin-right': 10}),
+        # Key of the selected symbol history (symbol + data version)
+        dcc.Store(id='history-store'),
+        # Columnar history of the selected symbol, sliced and drawn in the browser
+        dcc.Store(id='history-data'),
+        # Chart templates and analysis parameters for the clientside callbacks
+        dcc.Store(id='chart-config', data={'charts': chart_config(), 'analyses': client_config()}),
+        # Last day shown on the chart and latest signals in live mode
+        dcc.Store(id='live-store'),
+        dcc.Store(id='live-signals')
+    ])
+
+
+app.layout = serve_layout
+
+
+# Index tables: only depend on the selected index, the stock table goes back to its first page
 @app.callback(
-    [Output(component_id='stock-table', component_property='data'),
-     Output(component_id='symbol-dropdown', component_property='options'),
-     # Output(component_id='symbol-dropdown', component_property='value'),
-     Output(component_id='chart', component_property='figure'),
-     Output(component_id='industries-table', component_property='data'),
+    [Output(component_id='stock-table', component_property='page_current'),
      Output(component_id='header_1', component_property='children'),
      Output(component_id='header_2', component_property='children'),
-     Output(component_id='main_header', component_property='children'),
-     Output(component_id='recommend-table', component_property='data'),
-     Output(component_id='header_3', component_property='children'),
      ],
+    [Input(component_id='index-dropdown', component_property='value')]
+)
+@timed()
+def update_index_tables(selected_index):
+    header_1 = f'Stocks {selected_index} from Same Industry'
+    header_2 = f'All Stocks in {selected_index}'
+
+    symbol_options = get_catalog_index().symbol_options(selected_index)
+    # Users click through the index stocks next: warm their histories in the background
+    get_scheduler().warm_symbols([option['value'] for option in symbol_options])
+
+    return 0, header_1, header_2
+
+
+# Symbol dropdown options: the best matches of what is typed (symbol or company name, every index),
+# the first stocks of the selected index while nothing is typed
+@app.callback(
+    Output(component_id='symbol-dropdown', component_property='options'),
+    [Input(component_id='index-dropdown', component_property='value'),
+     Input(component_id='symbol-dropdown', component_property='search_value')
+     ],
+    [State(component_id='symbol-dropdown', component_property='value')]
+)
+@timed()
+def update_symbol_options(selected_index, search_value, selected_symbol):
+    selected = [selected_symbol] if selected_symbol else []
+    return get_catalog_index().search_options(selected_index, search_value, selected)
+
+
+# Same search for the comparison dropdown, its selected symbols stay in the options; once
+# COMPARE_MAX_SYMBOLS - 1 are selected the other options are disabled
+@app.callback(
+    Output(component_id='compare-dropdown', component_property='options'),
     [Input(component_id='index-dropdown', component_property='value'),
-     Input(component_id='filter-charts', component_property='value'),
-     Input(component_id='symbol-dropdown', component_property='value'),
+     Input(component_id='compare-dropdown', component_property='search_value'),
+     Input(component_id='compare-dropdown', component_property='value')
+     ]
+)
+@timed()
+def update_compare_options(selected_index, search_value, compare_symbols):
+    compare_symbols = compare_symbols or []
+    options = get_catalog_index().search_options(selected_index, search_value, compare_symbols)
+    if len(compare_symbols) >= COMPARE_MAX_SYMBOLS - 1:
+        options = [dict(option, disabled=option['value'] not in compare_symbols) for option in options]
+    return options
+
+
+# Stock table: the visible page of the index stocks
+@app.callback(
+    [Output(component_id='stock-table', component_property='data'),
+     Output(component_id='stock-table', component_property='page_count'),
+     ],
+    [Input(component_id='index-dropdown', component_property='value'),
+     Input(component_id='stock-table', component_property='page_current'),
+     Input(component_id='stock-table', component_property='page_size'),
+     Input(component_id='stock-table', component_property='sort_by'),
+     Input(component_id='stock-table', component_property='filter_query')
+     ]
+)
+@timed()
+def update_stock_table(selected_index, page_current, page_size, sort_by, filter_query):
+    catalog_index = get_catalog_index()
+    return query_table(catalog_index.frame(selected_index), page_current, page_size, sort_by, filter_query,
+                       records=catalog_index.records(selected_index))
+
+
+# Screener: signals of every stock of the selected index, read from the batch output
+@app.callback(
+    [Output(component_id='screener-table', component_property='data'),
+     Output(component_id='header_4', component_property='children'),
+     ],
+    [Input(component_id='index-dropdown', component_property='value')]
+)
+@timed()
+def update_screener(selected_index):
+    header_4 = f'Screener - Trade Recommendations for All Stocks in {selected_index}'
+    records = get_catalog_index().records(selected_index)
+    new_main_table_df = pd.DataFrame(records, columns=['Symbol', 'Company Name'])
+    screener_df = new_main_table_df.merge(read_signals(), on='Symbol', how='inner')
+    return screener_df.to_dict('records'), header_4
+
+
+# Symbol history: only depends on the selected symbol, the stores get its key and version and the history itself
+@app.callback(
+    [Output(component_id='history-store', component_property='data'),
+     Output(component_id='history-data', component_property='data'),
+     Output(component_id='header_3', component_property='children'),
+     ],
+    [Input(component_id='symbol-dropdown', component_property='value')]
+)
+@timed()
+def update_history_store(selected_symbol):
+    if not selected_symbol:
+        raise PreventUpdate
+    header_3 = f'Trade Recommendations for {selected_symbol}'
+    get_scheduler().record_view(selected_symbol)
+    history_key, payload = symbol_history_data(selected_symbol)
+    return history_key, payload, header_3
+
+
+# Backtest of the rules on the selected symbol, shared by the workers per symbol and data version
+@app.callback(
+    Output(component_id='backtest-table', component_property='data'),
+    [Input(component_id='history-store', component_property='data')]
+)
+@timed()
+def update_backtest_table(history_key):
+    if not history_key:
+        raise PreventUpdate
+    selected_symbol = history_key['symbol']
+    return backtest_cache.get_or_compute(
+        [selected_symbol, history_key['version']],
+        lambda: backtest_records(get_symbol_arrays(selected_symbol)['Close']))
+
+
+# Peer comparison of the selected symbol, from the stored histories of its industries (no fetch in the request)
+@app.callback(
+    [Output(component_id='peers-table', component_property='data'),
+     Output(component_id='header_5', component_property='children'),
+     ],
+    [Input(component_id='history-store', component_property='data')]
+)
+@timed()
+def update_peers_table(history_key):
+    if not history_key:
+        raise PreventUpdate
+    selected_symbol = history_key['symbol']
+    header_5 = f'{selected_symbol} against the Stocks of its Industries - Last {PEER_WINDOW_DAYS} Trading Days'
+    return peer_records(selected_symbol), header_5
+
+
+# Comparison chart: the selected symbol and the compared ones, loaded concurrently; the symbols that
+# could not be loaded in time are listed under the chart
+@app.callback(
+    [Output(component_id='compare-chart', component_property='figure'),
+     Output(component_id='compare-note', component_property='children'),
+     ],
+    [Input(component_id='symbol-dropdown', component_property='value'),
+     Input(component_id='compare-dropdown', component_property='value'),
      Input(component_id='date-range-picker', component_property='start_date'),
      Input(component_id='date-range-picker', component_property='end_date')
      ]
 )
+@timed()
+def update_compare_chart(selected_symbol, compare_symbols, start_date, end_date):
+    symbols = list(dict.fromkeys([symbol for symbol in [selected_symbol] + (compare_symbols or []) if symbol]))
+    if len(symbols) < 2:
+        return build_comparison_figure({}), ''
+    # A selection made before the dropdown disabled its other options
+    notes = [f'Only the first {COMPARE_MAX_SYMBOLS} stocks are shown'] if len(symbols) > COMPARE_MAX_SYMBOLS else []
+    symbols = symbols[:COMPARE_MAX_SYMBOLS]
+    start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+    end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
 
-def update_table(selected_index, selected_chart, selected_symbol, start_date, end_date):
-    header_1 = f'Stocks {selected_index} from Same Industry'
-    header_2 = f'All Stocks in {selected_index}'
-    header_3 = f'Trade Recommendations for {selected_symbol}'
+    histories, failed = load_symbol_histories(symbols)
+    ranges = {}
+    for symbol, arrays in histories.items():
+        selected = arrays.between(start_date, end_date)
+        if len(selected) == 0:
+            failed.append(symbol)
+        else:
+            ranges[symbol] = selected.frame()
+    if failed:
+        notes.append(f'No data for {", ".join(failed)}')
+    return build_comparison_figure(ranges), '; '.join(notes)
 
-    # Get the stock data for the selected index
-    new_df = df_symbols[df_symbols['Stock Index'] == selected_index]
-    new_main_table_df = new_df[['Symbol', 'Company Name', 'Country', 'Stock Index', 'Year of Founded', '#Employees']]
-    table_data = new_main_table_df.to_dict('records')
 
-    symbol_options = [{'label': symbol, 'value': symbol} for symbol in new_df['Symbol'].unique()]
-    # value = selected_index
+# Stocks from the same industry go back to their first page when the index or symbol changes
+@app.callback(
+    Output(component_id='industries-table', component_property='page_current'),
+    [Input(component_id='index-dropdown', component_property='value'),
+     Input(component_id='symbol-dropdown', component_property='value')
+     ]
+)
+@timed()
+def reset_industries_page(selected_index, selected_symbol):
+    return 0
 
-    selected_ind = list(df_industries[df_industries['Symbol'] == selected_symbol]['Industries'])
-    selected_ind_symbol = list(df_industries[df_industries['Industries'].isin(selected_ind)]['Symbol'].unique())
-    df_second_table = new_main_table_df[new_main_table_df['Symbol'].isin(selected_ind_symbol)].reset_index(drop=True)
-    second_table_data = df_second_table.to_dict('records')
+
+# Stocks from the same industry: the visible page, depends on the selected index and symbol
+@app.callback(
+    [Output(component_id='industries-table', component_property='data'),
+     Output(component_id='industries-table', component_property='page_count'),
+     ],
+    [Input(component_id='index-dropdown', component_property='value'),
+     Input(component_id='symbol-dropdown', component_property='value'),
+     Input(component_id='industries-table', component_property='page_current'),
+     Input(component_id='industries-table', component_property='page_size'),
+     Input(component_id='industries-table', component_property='sort_by'),
+     Input(component_id='industries-table', component_property='filter_query')
+     ]
+)
+@timed()
+def update_industries_table(selected_index, selected_symbol, page_current, page_size, sort_by, filter_query):
+    catalog_index = get_catalog_index()
+    return query_table(catalog_index.peer_frame(selected_index, selected_symbol), page_current, page_size, sort_by,
+                       filter_query, records=catalog_index.peer_records(selected_index, selected_symbol))
 
 
-    msft_new = yf.Ticker(selected_symbol)
-    history_range = msft_new.history(period="5y")
+# Get the history of the symbol in the store for the selected dates
+def _selected_history(history_key, start_date, end_date):
+    if not history_key:
+        raise PreventUpdate
     start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
     end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+    return get_history_range(history_key['symbol'], start_date, end_date)
 
-    df_history = history_range.reset_index(drop=False)
-    df_history['Date'] = pd.to_datetime(df_history['Date']).dt.date
-    df_history = df_history[(df_history['Date'] >= start_date) & (df_history['Date'] <= end_date)]
-    # Add a column to the DataFrame that indicates the trend
-    first_open = df_history['Open'].iloc[0]
-    # Get the last close price
-    last_close = df_history['Close'].iloc[-1]
-    # Compare the first open price to the last close price
-    if first_open < last_close:
-        trend_fill_color = 'green'
-    else:
-        trend_fill_color = 'red'
 
-    result = new_main_table_df[new_main_table_df['Symbol'] == selected_symbol]
-    if result.size > 0:
+# Selected stock header: its text depends on the index and symbol (its colour is set in the browser)
+@app.callback(
+    Output(component_id='main_header', component_property='children'),
+    [Input(component_id='index-dropdown', component_property='value'),
+     Input(component_id='symbol-dropdown', component_property='value')
+     ]
+)
+@timed()
+def update_main_header(selected_index, selected_symbol):
+    if not selected_symbol:
+        raise PreventUpdate
+
+    catalog_index = get_catalog_index()
+    selected_ind = catalog_index.industries(selected_symbol)
+    result = catalog_index.symbol_row(selected_index, selected_symbol)
+    if result is not None:
         selected_stock_info = 'Selected Stock: (' + selected_symbol + ') ' + \
-                              new_main_table_df[new_main_table_df['Symbol'] == selected_symbol]['Company Name'].values[
-                                  0] + \
+                              result['Company Name'] + \
                               '  |  Industries: ' + ', '.join(selected_ind) + ' |  Country Origin: ' + \
-                              new_main_table_df[new_main_table_df['Symbol'] == selected_symbol]['Country'].values[0]
+                              result['Country']
     else:
         selected_stock_info = 'Selected Stock: (' + selected_symbol + ') ' + \
                               'Not Found' + \
                               '  |  Industries: ' + ', '.join(selected_ind) + '  |  Country Origin: ' + \
                               'Not Found'
 
+    return selected_stock_info
+
+
+# Chart type and dates are applied in the browser to the history shipped once per symbol (assets/charts.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='render_chart'),
+    Output(component_id='chart', component_property='figure'),
+    [Input(component_id='history-data', component_property='data'),
+     Input(component_id='filter-charts', component_property='value'),
+     Input(component_id='date-range-picker', component_property='start_date'),
+     Input(component_id='date-range-picker', component_property='end_date')
+     ],
+    [State(component_id='chart-config', component_property='data')]
+)
+
+# Trend colour of the selected stock header
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='trend_style'),
+    Output(component_id='main_header', component_property='style'),
+    [Input(component_id='history-data', component_property='data'),
+     Input(component_id='date-range-picker', component_property='start_date'),
+     Input(component_id='date-range-picker', component_property='end_date')
+     ],
+    [State(component_id='main_header', component_property='style')]
+)
+
+# Recommendations of the selected dates (or the live signals computed on the server)
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='render_recommendations'),
+    Output(component_id='recommend-table', component_property='data'),
+    [Input(component_id='history-data', component_property='data'),
+     Input(component_id='date-range-picker', component_property='start_date'),
+     Input(component_id='date-range-picker', component_property='end_date'),
+     Input(component_id='live-signals', component_property='data')
+     ],
+    [State(component_id='chart-config', component_property='data')]
+)
+
 
-    stok_info_header = html.H1(selected_stock_info, style={'text-align': 'center', 'font-family': 'roboto',
-                                     'fontSize': 20, 'backgroundColor': '#ffffff',
-                                     'color': trend_fill_color}),
+# Live mode: only the newest bars are applied to the saved indicator state of the symbol
+@app.callback(
+    Output(component_id='live-signals', component_property='data'),
+    [Input(component_id='live-interval', component_property='n_intervals')],
+    [State(component_id='history-store', component_property='data')],
+    # Not on page load: the interval starts disabled
+    prevent_initial_call=True
+)
+@timed()
+def update_live_signals(n_intervals, history_key):
+    if not history_key:
+        raise PreventUpdate
+    history = get_history(history_key['symbol'], max_age=LIVE_REFRESH_SECONDS)
+    signals = update_symbol_state(history_key['symbol'], history).signals()
+    return {'symbol': history_key['symbol'], 'records': recommendations_table(signals).to_dict('records')}
 
 
+# Live mode on/off
+@app.callback(
+    Output(component_id='live-interval', component_property='disabled'),
+    [Input(component_id='live-mode', component_property='value')],
+    # Live mode starts off, as the interval in the layout
+    prevent_initial_call=True
+)
+@timed()
+def toggle_live_mode(live_value):
+    return 'live' not in (live_value or [])
+
+
+# Live mode: append the bars newer than the last one on the chart, the figure itself is not rebuilt
+@app.callback(
+    [Output(component_id='chart', component_property='extendData'),
+     Output(component_id='live-store', component_property='data')
+     ],
+    [Input(component_id='live-interval', component_property='n_intervals')],
+    [State(component_id='history-store', component_property='data'),
+     State(component_id='filter-charts', component_property='value'),
+     State(component_id='date-range-picker', component_property='start_date'),
+     State(component_id='date-range-picker', component_property='end_date'),
+     State(component_id='live-store', component_property='data')
+     ],
+    prevent_initial_call=True
+)
+@timed()
+def extend_live_chart(n_intervals, history_key, selected_chart, start_date, end_date, live_key):
+    if not history_key:
+        raise PreventUpdate
+    # The chart was built from the history version in the store, up to its last day
+    version_day = history_key['version'].split('/')[0]
+    if not version_day or end_date < version_day:
+        # The selected dates do not reach the newest bars
+        raise PreventUpdate
+    if selected_chart != 'line' and len(_selected_history(history_key, start_date, end_date)) > CHART_MAX_POINTS:
+        # Resampled weekly/monthly bars, the chart gets the newest bars with its next rebuild
+        raise PreventUpdate
+    chart_key = {key: history_key[key] for key in ('symbol', 'version')}
+    chart_key.update(chart=selected_chart, start=start_date, end=end_date)
+    if live_key and all(live_key.get(key) == value for key, value in chart_key.items()):
+        last_day = live_key['last_day']
+    else:
+        last_day = version_day
+
+    history = get_history(history_key['symbol'], max_age=LIVE_REFRESH_SECONDS)
+    new_bars = history[history.index > pd.Timestamp(last_day)]
+    if new_bars.empty:
+        raise PreventUpdate
+    dates = [str(day.date()) for day in new_bars.index]
     if selected_chart == 'line':
-        # Find the minimum and maximum values in the y data series
-        y_min = min(df_history['Close'])
-        y_max = max(df_history['Close'])
-        fig = px.line(df_history, x="Date", y="Close", range_y=[y_min*0.9, y_max*1.2])
-        fig.update_traces(fill='tozeroy', line=dict(color=trend_fill_color))
-        fig.update_layout(title='Stock Price Trend',
-                          title_x=0.5,
-                          template="plotly_white",
-                          colorway=['#f44336', '#3f51b5', '#2196f3', '#009688', '#4caf50'],
-                          font=dict(family='roboto', size=12),
-                          #paper_bgcolor='#F5F5F5',
-                          plot_bgcolor='#F5F5F5',
-                          margin=dict(l=50, r=50, b=50, t=50, pad=4))
-        # Add an annotation for the minimum value
-        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmin()], y=y_min,
-                           text=f"Min: {y_min:.2f}", showarrow=True, arrowhead=7, arrowsize=1, font=dict(family='roboto', size=16, color='red'))
-        # Add an annotation for the maximum value
-        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmax()], y=y_max,
-                           text=f"Max: {y_max:.2f}", showarrow=True, arrowhead=7, arrowsize=1, font=dict(family='roboto', size=16, color='green'))
+        new_data = {'x': [dates], 'y': [list(new_bars['Close'])]}
     else:
-        # Find the minimum and maximum values in the y data series
-        y_min = min(df_history['Close'])
-        y_max = max(df_history['Close'])
-        fig = go.Figure(data=[go.Candlestick(x=df_history['Date'],
-                                             open=df_history['Open'],
-                                             high=df_history['High'],
-                                             low=df_history['Low'],
-                                             close=df_history['Close'],
-                                             visible=True
-                                             )])
-        fig.update_layout(title='Stock Price History',
-                          title_x=0.5,
-                          yaxis=dict(range=[y_min*0.9, y_max*1.1]),
-                          template="plotly_white",
-                          colorway=['#f44336', '#3f51b5', '#2196f3', '#009688', '#4caf50'],
-                          font=dict(family='roboto', size=12),
-                          #paper_bgcolor='#F5F5F5',
-                          plot_bgcolor='#F5F5F5',
-                          #plot_bgcolor='black',
-                          xaxis_rangeslider_visible=False,
-                          margin=dict(l=50, r=50, b=50, t=50, pad=4))
-        # Add an annotation for the minimum value
-        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmin()], y=y_min,
-                           text=f"Min: {y_min:.2f}", showarrow=True, arrowhead=7, arrowsize=2, font=dict(family='roboto', size=16, color='red'))
-        # Add an annotation for the maximum value
-        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmax()], y=y_max,
-                           text=f"Max: {y_max:.2f}", showarrow=True, arrowhead=7, arrowsize=2, font=dict(family='roboto', size=16, color='green'))
-
-    # MACD Analysis
-    macd_results = func_macd(df_history)
-    # Bollinger Bands Analysis
-    bb_results = bb_func(df_history)
-    # RSI Analysis
-    rsi_results = rsi_func(df_history)
-    # Append Analysis Results Tables
-    recomm_df = pd.concat([macd_results, bb_results, rsi_results])
-
-    recommend_table_data = recomm_df.to_dict('records')
-
-    return table_data, symbol_options,  fig, second_table_data, header_1, header_2, stok_info_header,\
-           recommend_table_data, header_3
+        new_data = {'x': [dates], 'open': [list(new_bars['Open'])], 'high': [list(new_bars['High'])],
+                    'low': [list(new_bars['Low'])], 'close': [list(new_bars['Close'])]}
+    chart_key['last_day'] = dates[-1]
+    return [new_data, [0]], chart_key
+
 
 if __name__ == '__main__':
     app.run_server(debug=True)
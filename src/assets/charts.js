@@ -0,0 +1,273 @@
+// Clientside rendering of the selected symbol: chart, trend colour and recommendations are computed
+// in the browser from the history shipped once per symbol ('history-data', server_store.history_payload),
+// with the chart templates and analysis parameters from the server ('chart-config', charts.chart_config
+// and analysis_func.client_config). Changing the chart type or the dates never reaches the server.
+(function () {
+    const noUpdate = function () {
+        return window.dash_clientside.no_update;
+    };
+
+    // Index of the first date > value (strict) or >= value in the sorted ISO dates
+    function bound(dates, value, strict) {
+        let lo = 0;
+        let hi = dates.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (dates[mid] < value || (strict && dates[mid] === value)) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    // History between the two dates (inclusive)
+    function sliceHistory(data, startDate, endDate) {
+        const start = bound(data.date, startDate.slice(0, 10), false);
+        const end = bound(data.date, endDate.slice(0, 10), true);
+        const history = {};
+        ['date', 'open', 'high', 'low', 'close'].forEach(function (col) {
+            history[col] = data[col].slice(start, end);
+        });
+        return history;
+    }
+
+    function dayNumber(date) {
+        return Date.parse(date + 'T00:00:00Z') / 864e5;
+    }
+
+    // First index of the min and max close, like pandas idxmin/idxmax
+    function minMax(values) {
+        let iMin = 0;
+        let iMax = 0;
+        for (let i = 1; i < values.length; i++) {
+            if (values[i] < values[iMin]) iMin = i;
+            if (values[i] > values[iMax]) iMax = i;
+        }
+        return [iMin, iMax];
+    }
+
+    // Compare the first open price to the last close price
+    function trendColor(history) {
+        return history.open[0] < history.close[history.close.length - 1] ? 'green' : 'red';
+    }
+
+    // Largest-Triangle-Three-Buckets, same as downsample.lttb
+    function lttb(x, y, nOut, keep) {
+        const n = y.length;
+        if (nOut >= n || nOut < 3) {
+            return y.map(function (_, i) { return i; });
+        }
+        // Bucket edges as numpy.linspace(1, n - 1, nOut - 1)
+        const step = (n - 2) / (nOut - 2);
+        const edges = [];
+        for (let i = 0; i < nOut - 2; i++) {
+            edges.push(Math.floor(i * step + 1));
+        }
+        edges.push(n - 1);
+        const selected = [0];
+        let previous = 0;
+        for (let bucket = 0; bucket < nOut - 2; bucket++) {
+            const start = edges[bucket];
+            const end = edges[bucket + 1];
+            const nextEnd = bucket + 2 < edges.length ? edges[bucket + 2] : n;
+            let nextX = 0;
+            let nextY = 0;
+            for (let i = end; i < nextEnd; i++) {
+                nextX += x[i];
+                nextY += y[i];
+            }
+            nextX /= nextEnd - end;
+            nextY /= nextEnd - end;
+            let best = start;
+            let bestArea = -1;
+            for (let i = start; i < end; i++) {
+                const area = Math.abs((x[previous] - nextX) * (y[i] - y[previous])
+                    - (x[previous] - x[i]) * (nextY - y[previous]));
+                if (area > bestArea) {
+                    bestArea = area;
+                    best = i;
+                }
+            }
+            previous = best;
+            selected.push(best);
+        }
+        selected.push(n - 1);
+        return Array.from(new Set(selected.concat(keep))).sort(function (a, b) { return a - b; });
+    }
+
+    // Period of a date for the resampling rules of downsample.RESAMPLE_RULES
+    const periodKeys = {
+        'W-FRI': function (date) {
+            const day = new Date(date + 'T00:00:00Z');
+            day.setUTCDate(day.getUTCDate() + (5 - day.getUTCDay() + 7) % 7);
+            return day.toISOString().slice(0, 10);
+        },
+        'M': function (date) { return date.slice(0, 7); },
+        'Q': function (date) { return date.slice(0, 4) + 'Q' + Math.floor((+date.slice(5, 7) - 1) / 3); },
+        'A': function (date) { return date.slice(0, 4); }
+    };
+
+    // Weekly, monthly ... bars when the daily ones do not fit in the point budget, same as downsample.resample_ohlc
+    function resampleOhlc(history, maxPoints, rules) {
+        if (history.date.length <= maxPoints) {
+            return history;
+        }
+        let keys = null;
+        for (let r = 0; r < rules.length; r++) {
+            keys = history.date.map(periodKeys[rules[r]]);
+            if (new Set(keys).size <= maxPoints) break;
+        }
+        const bars = {date: [], open: [], high: [], low: [], close: []};
+        for (let i = 0; i < keys.length; i++) {
+            const last = bars.date.length - 1;
+            if (i === 0 || keys[i] !== keys[i - 1]) {
+                bars.date.push(history.date[i]);
+                bars.open.push(history.open[i]);
+                bars.high.push(history.high[i]);
+                bars.low.push(history.low[i]);
+                bars.close.push(history.close[i]);
+            } else {
+                bars.date[last] = history.date[i];
+                bars.high[last] = Math.max(bars.high[last], history.high[i]);
+                bars.low[last] = Math.min(bars.low[last], history.low[i]);
+                bars.close[last] = history.close[i];
+            }
+        }
+        return bars;
+    }
+
+    function buildFigure(history, chartType, config) {
+        const chart = config[chartType];
+        const extremes = minMax(history.close);
+        const yMin = history.close[extremes[0]];
+        const yMax = history.close[extremes[1]];
+        const trace = Object.assign({}, chart.trace);
+        if (chartType === 'line') {
+            const x = history.date.map(dayNumber);
+            const points = lttb(x, history.close, config.max_points - 2, extremes);
+            trace.x = points.map(function (i) { return history.date[i]; });
+            trace.y = points.map(function (i) { return history.close[i]; });
+            trace.line = Object.assign({}, trace.line, {color: trendColor(history)});
+        } else {
+            const bars = resampleOhlc(history, config.max_points, config.resample_rules);
+            trace.x = bars.date;
+            trace.open = bars.open;
+            trace.high = bars.high;
+            trace.low = bars.low;
+            trace.close = bars.close;
+        }
+        const layout = JSON.parse(JSON.stringify(chart.layout));
+        layout.yaxis = Object.assign({}, layout.yaxis,
+            {range: [yMin * chart.range_factors[0], yMax * chart.range_factors[1]]});
+        // Min/max annotations from the full daily history
+        layout.annotations = [
+            Object.assign({}, chart.annotations[0],
+                {x: history.date[extremes[0]], y: yMin, text: 'Min: ' + yMin.toFixed(2)}),
+            Object.assign({}, chart.annotations[1],
+                {x: history.date[extremes[1]], y: yMax, text: 'Max: ' + yMax.toFixed(2)})
+        ];
+        return {data: [trace], layout: layout};
+    }
+
+    // Exponential moving average, same as pandas ewm(span, adjust=False)
+    function ewm(values, span) {
+        const alpha = 2 / (span + 1);
+        const result = new Array(values.length);
+        let previous = values[0];
+        for (let i = 0; i < values.length; i++) {
+            previous = i === 0 ? values[0] : ((1 - alpha) * previous + alpha * values[i]) / ((1 - alpha) + alpha);
+            result[i] = previous;
+        }
+        return result;
+    }
+
+    function mean(values) {
+        return values.reduce(function (total, value) { return total + value; }, 0) / values.length;
+    }
+
+    // Latest Buy/Sell/Hold of every analysis, same rules as analysis_func.latest_signals
+    function latestSignals(close, analyses) {
+        const n = close.length;
+        const last = close[n - 1];
+
+        const fast = ewm(close, analyses.macd[0]);
+        const slow = ewm(close, analyses.macd[1]);
+        const macdLine = fast.map(function (value, i) { return value - slow[i]; });
+        const signalLine = ewm(macdLine, analyses.macd[2]);
+        const macdSignal = macdLine[n - 1] - signalLine[n - 1] > 0 ? 'Buy' : 'Sell';
+
+        let bbSignal = 'Hold';
+        const bbPeriod = analyses.bb[0];
+        if (n >= bbPeriod) {
+            const window = close.slice(n - bbPeriod);
+            const rollingMean = mean(window);
+            const rollingStd = Math.sqrt(window.reduce(function (total, value) {
+                return total + (value - rollingMean) * (value - rollingMean);
+            }, 0) / (bbPeriod - 1));
+            if (last > rollingMean + analyses.bb[1] * rollingStd) {
+                bbSignal = 'Sell';
+            } else if (last < rollingMean - analyses.bb[2] * rollingStd) {
+                bbSignal = 'Buy';
+            }
+        }
+
+        let rsiSignal = 'Hold';
+        const rsiPeriod = analyses.rsi[0];
+        if (n >= rsiPeriod) {
+            const up = [];
+            const down = [];
+            for (let i = n - rsiPeriod; i < n; i++) {
+                // The first day has no movement
+                const diff = i === 0 ? 0 : close[i] - close[i - 1];
+                up.push(Math.max(diff, 0));
+                down.push(Math.max(-diff, 0));
+            }
+            const rsi = 100 - (100 / (1 + mean(up) / mean(down)));
+            if (rsi > analyses.rsi[1]) {
+                rsiSignal = 'Sell';
+            } else if (rsi < analyses.rsi[2]) {
+                rsiSignal = 'Buy';
+            }
+        }
+        return [macdSignal, bbSignal, rsiSignal];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        charts: {
+            render_chart: function (data, chartType, startDate, endDate, config) {
+                if (!data || !config || !startDate || !endDate) return noUpdate();
+                const history = sliceHistory(data, startDate, endDate);
+                if (history.date.length === 0) return noUpdate();
+                return buildFigure(history, chartType, config.charts);
+            },
+
+            trend_style: function (data, startDate, endDate, style) {
+                if (!data || !startDate || !endDate) return noUpdate();
+                const history = sliceHistory(data, startDate, endDate);
+                if (history.date.length === 0) return noUpdate();
+                return Object.assign({}, style, {color: trendColor(history)});
+            },
+
+            render_recommendations: function (data, startDate, endDate, liveSignals, config) {
+                const triggered = (window.dash_clientside.callback_context.triggered || []).map(function (t) {
+                    return t.prop_id;
+                });
+                // Live mode: signals of the saved indicator state, computed on the server
+                if (triggered.indexOf('live-signals.data') !== -1) {
+                    if (liveSignals && data && liveSignals.symbol === data.symbol) return liveSignals.records;
+                    return noUpdate();
+                }
+                if (!data || !config || !startDate || !endDate) return noUpdate();
+                const history = sliceHistory(data, startDate, endDate);
+                if (history.date.length === 0) return noUpdate();
+                const analyses = config.analyses;
+                const signals = latestSignals(history.close, analyses);
+                return analyses.names.map(function (name, i) {
+                    return {'Analysis': name, 'Description': analyses.descriptions[name], 'Recommendation': signals[i]};
+                });
+            }
+        }
+    });
+})();
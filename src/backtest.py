@@ -0,0 +1,222 @@
+# Backtest of the Buy/Sell/Hold rules of analysis_func over the stored histories, with parameter sweeps:
+#   python backtest.py --index DAX [--top 5]
+# Every parameter combination and symbol is replayed at once with NumPy broadcasting
+# (arrays of combinations x symbols x days), only the EMA recursion steps through the days.
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from analysis_func import MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD, BB_TIMEPERIOD, BB_NBDEVUP, \
+    BB_NBDEVDN, RSI_TIMEPERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD, MACD_NAME, BB_NAME, RSI_NAME
+from config import BACKTEST_HORIZON, SWEEP_MAX_CELLS
+from metrics import timed
+from price_store import get_history
+
+# Parameter grids of the sweeps, they include the parameters of the app
+MACD_GRID = {'fast': [5, 8, 12, 16, 20], 'slow': [21, 26, 30, 35, 40], 'signal': [5, 7, 9, 12]}
+BB_GRID = {'period': [10, 15, 20, 25, 30], 'up': [1.5, 2.0, 2.5, 3.0], 'down': [1.5, 2.0, 2.5, 3.0]}
+RSI_GRID = {'period': [7, 10, 14, 21], 'overbought': [65, 70, 75, 80], 'oversold': [20, 25, 30, 35]}
+DEFAULT_PARAMS = {MACD_NAME: {'fast': MACD_FAST_PERIOD, 'slow': MACD_SLOW_PERIOD, 'signal': MACD_SIGNAL_PERIOD},
+                  BB_NAME: {'period': BB_TIMEPERIOD, 'up': BB_NBDEVUP, 'down': BB_NBDEVDN},
+                  RSI_NAME: {'period': RSI_TIMEPERIOD, 'overbought': RSI_OVERBOUGHT, 'oversold': RSI_OVERSOLD}}
+BACKTEST_COLUMNS = ['Analysis', 'Hit Rate', 'Return', 'Max Drawdown', 'Best Parameters', 'Best Return']
+
+# Recommendation of a day
+BUY, HOLD, SELL = 1, 0, -1
+
+
+# Every combination of the grid: parameter -> array with one value per combination
+def _combinations(grid):
+    mesh = np.meshgrid(*[np.asarray(values) for values in grid.values()], indexing='ij')
+    return {name: values.ravel() for name, values in zip(grid, mesh)}
+
+
+# pandas ewm(span, adjust=False) over the last axis, alpha is broadcast against values[..., 0]
+def _ewm(values, alpha):
+    result = np.empty(values.shape)
+    previous = np.full(np.broadcast_shapes(values.shape[:-1], np.shape(alpha)), np.nan)
+    for day in range(values.shape[-1]):
+        value = values[..., day]
+        step = ((1 - alpha) * previous + alpha * value) / ((1 - alpha) + alpha)
+        previous = np.where(np.isnan(previous), value, np.where(np.isnan(value), previous, step))
+        result[..., day] = previous
+    return result
+
+
+# Rolling mean and sample std over the last axis, NaN until the window is full
+def _rolling_mean_std(values, window):
+    mean = np.full(values.shape, np.nan)
+    std = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1)
+        mean[..., window - 1:] = windows.mean(axis=-1)
+        std[..., window - 1:] = windows.std(axis=-1, ddof=1)
+    return mean, std
+
+
+# Recommendations of every combination: (combinations x symbols x days) of BUY/HOLD/SELL
+def _macd_events(close, params):
+    spans = np.unique(np.concatenate([params['fast'], params['slow']]))
+    emas = _ewm(np.broadcast_to(close, (len(spans),) + close.shape), (2 / (spans + 1.0))[:, None])
+    macd_line = emas[np.searchsorted(spans, params['fast'])] - emas[np.searchsorted(spans, params['slow'])]
+    hist = macd_line - _ewm(macd_line, (2 / (params['signal'] + 1.0))[:, None])
+    return np.where(np.isnan(hist), HOLD, np.where(hist > 0, BUY, SELL)).astype(np.int8)
+
+
+def _bb_events(close, params):
+    periods = np.unique(params['period'])
+    bands = [_rolling_mean_std(close, period) for period in periods]
+    index = np.searchsorted(periods, params['period'])
+    mean = np.stack([band[0] for band in bands])[index]
+    std = np.stack([band[1] for band in bands])[index]
+    upper = mean + params['up'][:, None, None] * std
+    lower = mean - params['down'][:, None, None] * std
+    return np.select([close > upper, close < lower], [SELL, BUY], HOLD).astype(np.int8)
+
+
+def _rsi_events(close, params):
+    diff = np.diff(close, axis=-1, prepend=np.nan)
+    up_movements = np.where(diff > 0, diff, 0.0)
+    down_movements = np.where(diff < 0, -diff, 0.0)
+    periods = np.unique(params['period'])
+    rsi_by_period = []
+    for period in periods:
+        avg_up, _ = _rolling_mean_std(up_movements, period)
+        avg_down, _ = _rolling_mean_std(down_movements, period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi_by_period.append(100 - (100 / (1 + avg_up / avg_down)))
+    rsi = np.stack(rsi_by_period)[np.searchsorted(periods, params['period'])]
+    return np.select([rsi > params['overbought'][:, None, None], rsi < params['oversold'][:, None, None]],
+                     [SELL, BUY], HOLD).astype(np.int8)
+
+
+RULES = {MACD_NAME: (MACD_GRID, _macd_events),
+         BB_NAME: (BB_GRID, _bb_events),
+         RSI_NAME: (RSI_GRID, _rsi_events)}
+
+
+# Hit rate, return and max drawdown of the recommendations (combinations x symbols x days):
+# long from a Buy until the next Sell, entered on the close of the signal day and held from the next day on;
+# a Buy or Sell is a hit when the close BACKTEST_HORIZON days later moved the recommended way
+def _evaluate(events, close, horizon):
+    days = np.arange(close.shape[-1])
+    last_signal = np.maximum.accumulate(np.where(events != HOLD, days, 0), axis=-1)
+    position = np.take_along_axis(events, last_signal, axis=-1) == BUY
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_returns = np.nan_to_num(close[..., 1:] / close[..., :-1] - 1)
+        forward_returns = close[..., horizon:] / close[..., :-horizon] - 1
+    equity = np.cumprod(1 + position[..., :-1] * daily_returns, axis=-1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=-1), 1.0)
+
+    judged = (events[..., :-horizon] != HOLD) & ~np.isnan(forward_returns)
+    hits = judged & (events[..., :-horizon] * forward_returns > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit_rate = hits.sum(axis=-1) / judged.sum(axis=-1)
+    return {'hit_rate': hit_rate,
+            'total_return': equity[..., -1] - 1,
+            'max_drawdown': 1 - (equity / peak).min(axis=-1)}
+
+
+# Backtest of every combination of the rule's grid on every symbol: close is (days,) or (symbols x days)
+# padded with leading NaN; returns the combinations and (combinations x symbols) arrays of the metrics
+@timed('backtest')
+def sweep(close, rule, grid=None, horizon=BACKTEST_HORIZON):
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    default_grid, events_func = RULES[rule]
+    params = _combinations(grid or default_grid)
+    combinations = len(next(iter(params.values())))
+    # Symbols per chunk, so the (combinations x symbols x days) arrays stay under SWEEP_MAX_CELLS
+    chunk = max(SWEEP_MAX_CELLS // (combinations * max(close.shape[-1], 1)), 1)
+    parts = [_evaluate(events_func(close[start: start + chunk], params), close[start: start + chunk], horizon)
+             for start in range(0, len(close), chunk)]
+    return params, {metric: np.concatenate([part[metric] for part in parts], axis=-1) for metric in parts[0]}
+
+
+def _format_params(params, index):
+    return ' / '.join(f'{name} {params[name][index]:g}' for name in params)
+
+
+def _default_index(params, rule):
+    matches = np.ones(len(next(iter(params.values()))), dtype=bool)
+    for name, value in DEFAULT_PARAMS[rule].items():
+        matches &= params[name] == value
+    return int(np.flatnonzero(matches)[0])
+
+
+def _json_number(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+# Backtest table of one symbol: the app's parameters and the best combination of each grid (by return),
+# as JSON data (NaN -> None) for the DataTable; empty without two days to trade
+def backtest_records(close):
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) < 2:
+        return []
+    records = []
+    for rule in RULES:
+        params, results = sweep(close, rule)
+        default = _default_index(params, rule)
+        best = int(np.nanargmax(results['total_return'][:, 0]))
+        record = {'Analysis': rule,
+                  'Hit Rate': results['hit_rate'][default, 0],
+                  'Return': results['total_return'][default, 0],
+                  'Max Drawdown': results['max_drawdown'][default, 0],
+                  'Best Parameters': _format_params(params, best),
+                  'Best Return': results['total_return'][best, 0]}
+        records.append({key: _json_number(value) if key != 'Best Parameters' and key != 'Analysis' else value
+                        for key, value in record.items()})
+    records.append({'Analysis': 'Buy & Hold', 'Return': _json_number(close[-1] / close[0] - 1)})
+    return records
+
+
+# Close prices of the symbols as (symbols x days) on the union of their trading days, padded with leading NaN
+# (missing days inside a history take the previous close)
+def close_matrix(symbols, histories=None):
+    histories = histories or {symbol: get_history(symbol) for symbol in symbols}
+    closes = pd.concat({symbol: histories[symbol]['Close'] for symbol in symbols if not histories[symbol].empty},
+                       axis=1).sort_index()
+    return closes.ffill().to_numpy(dtype=np.float64).T
+
+
+# Mean metrics of every combination over the symbols, best combinations first
+def index_report(close, rule, top):
+    params, results = sweep(close, rule)
+    # Symbols without any judged signal have a NaN hit rate
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        report = pd.DataFrame({'Parameters': [_format_params(params, i) for i in range(len(results['hit_rate']))],
+                               'Hit Rate': np.nanmean(results['hit_rate'], axis=1),
+                               'Return': np.nanmean(results['total_return'], axis=1),
+                               'Max Drawdown': np.nanmean(results['max_drawdown'], axis=1)})
+    report['Default'] = np.arange(len(report)) == _default_index(params, rule)
+    report = report.sort_values('Return', ascending=False)
+    return pd.concat([report.head(top), report[report['Default']]]).drop_duplicates('Parameters')
+
+
+def main():
+    from stocks_import import df_symbols
+
+    parser = argparse.ArgumentParser(description='Backtest and parameter sweep of the MACD/Bollinger/RSI rules')
+    parser.add_argument('--index', default='DAX', help='Stock index whose symbols are backtested')
+    parser.add_argument('--top', type=int, default=5, help='Best combinations shown per rule')
+    args = parser.parse_args()
+
+    symbols = list(dict.fromkeys(df_symbols.loc[df_symbols['Stock Index'] == args.index, 'Symbol']))
+    started = time.time()
+    close = close_matrix(symbols)
+    print(f'{close.shape[0]} symbols x {close.shape[1]} days loaded in {time.time() - started:.1f}s')
+    for rule in RULES:
+        started = time.time()
+        report = index_report(close, rule, args.top)
+        combinations = int(np.prod([len(values) for values in RULES[rule][0].values()]))
+        print(f'\n{rule}: {combinations} combinations x {close.shape[0]} symbols in {time.time() - started:.1f}s')
+        print(report.to_string(index=False, float_format=lambda value: f'{value:.3f}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Batch Buy/Sell/Hold signals for every symbol of the catalog, run outside of the web workers:
+#   python batch_signals.py [--index "NASDAQ 100"] [--workers 4] [--restart]
+# Results are appended line by line (NDJSON) to SIGNALS_FILE, an interrupted run resumes where it stopped.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from analysis_func import MACD_NAME, BB_NAME, RSI_NAME, latest_signals
+from config import SIGNALS_FILE
+from price_store import get_history, refresh_many
+from stocks_import import df_symbols
+
+SIGNAL_COLUMNS = {MACD_NAME: 'MACD', BB_NAME: 'Bollinger Bands', RSI_NAME: 'RSI'}
+# Symbols downloaded together before their signals are computed
+BULK_FETCH_SIZE = 100
+
+
+# Signals of one symbol, runs in the pool processes
+def symbol_signals(symbol):
+    try:
+        history = get_history(symbol)
+        close = history['Close'].to_numpy()
+        signals = latest_signals(close)
+    except Exception as error:
+        return {'Symbol': symbol, 'Error': f'{type(error).__name__}: {error}'}
+    result = {'Symbol': symbol,
+              'Date': str(history.index[-1].date()),
+              'Last Close': round(float(close[-1]), 2)}
+    for name, column in SIGNAL_COLUMNS.items():
+        result[column] = signals[name]
+    return result
+
+
+# Results of the symbols that did not fail, in file order; a partial last line of an interrupted run is skipped
+def _signal_records(path):
+    records = []
+    with open(path) as signals_file:
+        for line in signals_file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if 'Error' not in result:
+                records.append(result)
+    return records
+
+
+# Symbols already in the output file (failed ones are tried again)
+def done_symbols(output):
+    if not os.path.exists(output):
+        return set()
+    return {result['Symbol'] for result in _signal_records(output)}
+
+
+def run(symbols, output=SIGNALS_FILE, workers=None, restart=False):
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if restart and os.path.exists(output):
+        os.remove(output)
+    done = done_symbols(output)
+    todo = [symbol for symbol in dict.fromkeys(symbols) if symbol not in done]
+    print(f'{len(done)} symbols already done, {len(todo)} to go')
+
+    started = time.time()
+    failed = 0
+    count = 0
+    chunks = [todo[start: start + BULK_FETCH_SIZE] for start in range(0, len(todo), BULK_FETCH_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=1) as fetcher, \
+            open(output, 'a') as signals_file:
+        # Bulk download of the first chunk, the pool processes then read the histories from the price store
+        if chunks:
+            refresh_many(chunks[0])
+        fetch = None
+        for number, chunk in enumerate(chunks):
+            if fetch is not None:
+                fetch.result()
+            # Submitting forks the pool processes (on the first chunk), before the fetch thread runs
+            results = pool.map(symbol_signals, chunk, chunksize=8)
+            # The next chunk downloads while the pool computes this one
+            if number + 1 < len(chunks):
+                fetch = fetcher.submit(refresh_many, chunks[number + 1])
+            # Stream every result to the file as soon as it is ready
+            for result in results:
+                signals_file.write(json.dumps(result) + '\n')
+                signals_file.flush()
+                failed += 'Error' in result
+                count += 1
+                if count % 100 == 0:
+                    print(f'{count}/{len(todo)} symbols in {time.time() - started:.1f}s')
+    print(f'Done: {len(todo) - failed} symbols, {failed} failed, {time.time() - started:.1f}s')
+
+
+SIGNALS_FRAME_COLUMNS = ['Symbol', 'Date', 'Last Close'] + list(SIGNAL_COLUMNS.values())
+_signals_cache = {'version': None, 'df': None}
+
+
+# Latest signals of every symbol from the batch output, reloaded only when the file changes; the typed empty
+# frame while a run has not written any result yet
+def read_signals(path=SIGNALS_FILE):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return pd.DataFrame(columns=SIGNALS_FRAME_COLUMNS)
+    version = (path, stat.st_mtime_ns, stat.st_size)
+    if _signals_cache['version'] != version:
+        df = pd.DataFrame(_signal_records(path), columns=SIGNALS_FRAME_COLUMNS)
+        _signals_cache['df'] = df.drop_duplicates(subset=['Symbol'], keep='last').reset_index(drop=True)
+        _signals_cache['version'] = version
+    return _signals_cache['df']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute the MACD/Bollinger/RSI signals of every symbol')
+    parser.add_argument('--index', help='Only the symbols of this stock index')
+    parser.add_argument('--output', default=SIGNALS_FILE)
+    parser.add_argument('--workers', type=int, default=None, help='Pool processes (default: number of CPUs)')
+    parser.add_argument('--restart', action='store_true', help='Start over instead of resuming')
+    args = parser.parse_args()
+
+    symbols = df_symbols
+    if args.index:
+        symbols = symbols[symbols['Stock Index'] == args.index]
+    run(list(symbols['Symbol']), output=args.output, workers=args.workers, restart=args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# Microbenchmarks of the indicators, the catalog build, the figures and the main callbacks:
+#   python benchmarks.py [--repeat 7] [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+#   python benchmarks.py --save-baseline        (keep this run as the baseline of the machine)
+# Runs offline: synthetic prices (PRICE_PROVIDER=synthetic) and a catalog snapshot in a temporary data folder.
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+# Before the app modules read the config
+if 'NAYA_DATA_DIR' not in os.environ:
+    os.environ['NAYA_DATA_DIR'] = TEMP_DATA_DIR = tempfile.mkdtemp(prefix='naya-bench-')
+else:
+    TEMP_DATA_DIR = None
+os.environ.setdefault('PRICE_PROVIDER', 'synthetic')
+os.environ.setdefault('PREFETCH_ENABLED', '0')
+
+from config import DATA_DIR, HOT_TIER_DIR, MEMO_CACHE_DIR  # noqa: E402
+from price_providers import SyntheticProvider  # noqa: E402
+
+SERIES_LENGTHS = [250, 1250, 5000]
+CHART_TYPES = ['line', 'candlestick']
+BENCH_INDEX = 'DAX'
+BENCH_SYMBOL = 'SAP'
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'benchmarks.json')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'benchmarks_baseline.json')
+
+
+# Seconds per call of func (median and min over `repeat` runs); setup runs untimed before every call
+def measure(func, repeat, setup=None):
+    if setup is None:
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    else:
+        times = []
+        for _ in range(repeat):
+            setup()
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+    return {'median': statistics.median(times), 'min': min(times), 'runs': repeat}
+
+
+def _history(length):
+    history = SyntheticProvider(years=length // 250 + 1).fetch('BENCH')
+    return history.iloc[-length:]
+
+
+def indicator_benchmarks():
+    from analysis_func import func_macd, bb_func, rsi_func
+
+    benchmarks = {}
+    for length in SERIES_LENGTHS:
+        history = _history(length)
+        for func in [func_macd, bb_func, rsi_func]:
+            benchmarks[f'{func.__name__}[{length}]'] = (lambda func=func, history=history: func(history), None)
+    return benchmarks
+
+
+def catalog_benchmarks():
+    from stocks_import import build_catalog
+
+    return {'stocks_import.build_catalog': (build_catalog, None)}
+
+
+def figure_benchmarks():
+    from charts import build_figure, get_trend_fill_color
+
+    benchmarks = {}
+    for length in SERIES_LENGTHS:
+        df_history = _history(length).reset_index()
+        color = get_trend_fill_color(df_history)
+        for chart in CHART_TYPES:
+            benchmarks[f'build_figure.{chart}[{length}]'] = \
+                (lambda chart=chart, df_history=df_history: build_figure(df_history, chart, color), None)
+    return benchmarks
+
+
+def callback_benchmarks():
+    import app
+
+    # Cold: nothing in the hot tier nor in the shared payload cache (the price store stays warm)
+    def clear_caches():
+        shutil.rmtree(HOT_TIER_DIR, ignore_errors=True)
+        shutil.rmtree(MEMO_CACHE_DIR, ignore_errors=True)
+
+    def symbol_change():
+        app.update_history_store(BENCH_SYMBOL)
+        app.update_industries_table(BENCH_INDEX, BENCH_SYMBOL, 0, 10, [], '')
+        app.update_main_header(BENCH_INDEX, BENCH_SYMBOL)
+
+    def index_change():
+        app.update_index_tables(BENCH_INDEX)
+        app.update_stock_table(BENCH_INDEX, 0, 10, [], '')
+
+    def symbol_search():
+        app.update_symbol_options(BENCH_INDEX, 'astra', BENCH_SYMBOL)
+
+    def sorted_page():
+        app.update_stock_table(BENCH_INDEX, 2, 10, [{'column_id': '#Employees', 'direction': 'desc'}],
+                               '{Country} contains e')
+
+    symbol_change()
+    return {'callback.index_change': (index_change, None),
+            'callback.stock_table_sort_filter': (sorted_page, None),
+            'callback.symbol_search': (symbol_search, None),
+            'callback.symbol_change.cold': (symbol_change, clear_caches),
+            'callback.symbol_change.warm': (symbol_change, None)}
+
+
+def run(repeat, selected=None):
+    benchmarks = {}
+    for group in [indicator_benchmarks, catalog_benchmarks, figure_benchmarks, callback_benchmarks]:
+        benchmarks.update(group())
+    results = {}
+    for name, (func, setup) in benchmarks.items():
+        if selected and not any(part in name for part in selected):
+            continue
+        results[name] = measure(func, 3 if name == 'stocks_import.build_catalog' else repeat, setup)
+        print(f'{name:45} {results[name]["median"] * 1000:10.3f} ms')
+    return {'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                     'node': platform.node(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results}
+
+
+# Benchmarks whose best run is more than `threshold` (0.2 = 20%) slower than the baseline
+# (the min is the least disturbed by the other processes of the machine)
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = result['min'] / base['min'] - 1
+        flag = ' REGRESSION' if change > threshold else ''
+        print(f'{name:45} {base["min"] * 1000:10.3f} -> {result["min"] * 1000:10.3f} ms {change:+7.1%}{flag}')
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the app, offline')
+    parser.add_argument('--repeat', type=int, default=7, help='Timed runs per benchmark')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON file of the results')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON file of the baseline results')
+    parser.add_argument('--threshold', type=float, default=float(os.environ.get('BENCH_THRESHOLD', 0.2)),
+                        help='Allowed slowdown against the baseline (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--only', nargs='*', help='Run only the benchmarks whose name contains one of these')
+    args = parser.parse_args()
+
+    print(f'Data folder: {DATA_DIR}\n')
+    try:
+        results = run(args.repeat, args.only)
+    finally:
+        if TEMP_DATA_DIR:
+            shutil.rmtree(TEMP_DATA_DIR, ignore_errors=True)
+    _write_json(args.output, results)
+    print(f'\nResults saved to {args.output}')
+
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print('No baseline yet (--save-baseline to create one)')
+        return
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f'\nAgainst the baseline of {baseline["meta"]["date"]} (threshold {args.threshold:.0%}):')
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
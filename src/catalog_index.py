@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import SYMBOL_SEARCH_RESULTS
+from stocks_import import get_catalog
+from symbol_search import SymbolSearch
+from table_query import page_records
+
+MAIN_TABLE_COLUMNS = ['Symbol', 'Company Name', 'Country', 'Stock Index', 'Year of Founded', '#Employees']
+
+
+# Lookup tables of the catalog, built once so the callbacks do dict lookups instead of DataFrame scans
+class CatalogIndex:
+    def __init__(self, df_symbols, df_industries, max_peer_tables=256):
+        # Search by symbol or company name over every index
+        self.symbol_search = SymbolSearch(df_symbols)
+        # Stock index -> its rows, records (already converted for the tables) and symbol options
+        self.index_frames = {}
+        self.index_records = {}
+        self.index_options = {}
+        # (stock index, symbol) -> its first row in the index, and symbol -> its first row in any index
+        self.symbol_rows = {}
+        self.first_rows = {}
+        for index, frame in df_symbols.groupby('Stock Index', sort=False, observed=True):
+            frame = frame[MAIN_TABLE_COLUMNS]
+            # The records point to the category strings of the catalog, they do not copy them
+            records = page_records(frame)
+            self.index_frames[index] = frame
+            self.index_records[index] = records
+            self.index_options[index] = [self.symbol_search.option(symbol) for symbol in frame['Symbol'].unique()]
+            for record in records:
+                self.symbol_rows.setdefault((index, record['Symbol']), record)
+                self.first_rows.setdefault(record['Symbol'], record)
+
+        # Symbol -> industries and industry -> symbols
+        self.symbol_industries = {symbol: list(industries) for symbol, industries
+                                  in df_industries.groupby('Symbol', sort=False, observed=True)['Industries']}
+        self.industry_symbols = {industry: list(symbols.unique()) for industry, symbols
+                                 in df_industries.groupby('Industries', sort=False, observed=True)['Symbol']}
+        # Symbol -> every symbol sharing one of its industries (itself included)
+        self.peers = {symbol: frozenset(peer for industry in industries for peer in self.industry_symbols[industry])
+                      for symbol, industries in self.symbol_industries.items()}
+        # (stock index, symbol) -> peer rows and records of the recently selected symbols, at most max_peer_tables
+        self.max_peer_tables = max_peer_tables
+        self._peer_frames = OrderedDict()
+        self._peer_records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def industries(self, symbol):
+        return self.symbol_industries.get(symbol, [])
+
+    def records(self, index):
+        return self.index_records.get(index, [])
+
+    def symbol_options(self, index):
+        return self.index_options.get(index, [])
+
+    # Options of a symbol dropdown: the best matches of the search over every index, or the first stocks of the
+    # index while nothing is typed; the selected symbols are kept so the dropdown can still show them
+    def search_options(self, index, search_value, selected=()):
+        if search_value:
+            # 'search' makes the dropdown keep the matches that its own filter (word prefixes) would hide
+            options = [dict(self.symbol_search.option(symbol, name), search=search_value)
+                       for symbol, name in self.symbol_search.search(search_value)]
+        else:
+            options = self.symbol_options(index)[:SYMBOL_SEARCH_RESULTS]
+        values = {option['value'] for option in options}
+        return options + [self.symbol_search.option(symbol) for symbol in selected if symbol not in values]
+
+    # Row of the symbol in the index, or in another index for a symbol found by the search
+    def symbol_row(self, index, symbol):
+        row = self.symbol_rows.get((index, symbol))
+        return self.first_rows.get(symbol) if row is None else row
+
+    def frame(self, index):
+        return self.index_frames.get(index, pd.DataFrame(columns=MAIN_TABLE_COLUMNS))
+
+    # Value of key in one of the peer caches, built by build() and the least recently used one dropped when missing
+    def _cached(self, cache, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self.max_peer_tables:
+                cache.popitem(last=False)
+        return value
+
+    # Rows of the index stocks from the same industries as the symbol
+    def peer_frame(self, index, symbol):
+        def build():
+            frame = self.frame(index)
+            peers = self.peers.get(symbol, frozenset())
+            return frame[frame['Symbol'].isin(peers)].reset_index(drop=True)
+        return self._cached(self._peer_frames, (index, symbol), build)
+
+    def peer_records(self, index, symbol):
+        return self._cached(self._peer_records, (index, symbol),
+                            lambda: page_records(self.peer_frame(index, symbol)))
+
+_catalog_index = None
+
+
+def get_catalog_index():
+    global _catalog_index
+    if _catalog_index is None:
+        catalog = get_catalog()
+        _catalog_index = CatalogIndex(catalog['df_symbols'], catalog['df_industries'])
+    return _catalog_index
@@ -0,0 +1,119 @@
+import datetime
+import json
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.express as px
+
+from config import CHART_MAX_POINTS
+from downsample import downsample_line, resample_ohlc, RESAMPLE_RULES
+from metrics import timed
+
+# y axis range of the charts, relative to the min/max close
+RANGE_FACTORS = {'line': (0.9, 1.2), 'candlestick': (0.9, 1.1)}
+
+
+def get_trend_fill_color(df_history):
+    # Compare the first open price to the last close price
+    first_open = df_history['Open'].iloc[0]
+    # Get the last close price
+    last_close = df_history['Close'].iloc[-1]
+    if first_open < last_close:
+        return 'green'
+    return 'red'
+
+
+# Line or candlestick chart of the history, the traces are reduced to max_points
+# while the min/max annotations are taken from the full history
+@timed('figure')
+def build_figure(df_history, selected_chart, trend_fill_color, max_points=CHART_MAX_POINTS):
+    if selected_chart == 'line':
+        # Find the minimum and maximum values in the y data series
+        y_min = min(df_history['Close'])
+        y_max = max(df_history['Close'])
+        fig = px.line(downsample_line(df_history, max_points), x="Date", y="Close", range_y=[y_min*RANGE_FACTORS['line'][0], y_max*RANGE_FACTORS['line'][1]])
+        fig.update_traces(fill='tozeroy', line=dict(color=trend_fill_color))
+        fig.update_layout(title='Stock Price Trend',
+                          title_x=0.5,
+                          template="plotly_white",
+                          colorway=['#f44336', '#3f51b5', '#2196f3', '#009688', '#4caf50'],
+                          font=dict(family='roboto', size=12),
+                          #paper_bgcolor='#F5F5F5',
+                          plot_bgcolor='#F5F5F5',
+                          margin=dict(l=50, r=50, b=50, t=50, pad=4))
+        # Add an annotation for the minimum value
+        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmin()], y=y_min,
+                           text=f"Min: {y_min:.2f}", showarrow=True, arrowhead=7, arrowsize=1, font=dict(family='roboto', size=16, color='red'))
+        # Add an annotation for the maximum value
+        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmax()], y=y_max,
+                           text=f"Max: {y_max:.2f}", showarrow=True, arrowhead=7, arrowsize=1, font=dict(family='roboto', size=16, color='green'))
+    else:
+        # Find the minimum and maximum values in the y data series
+        y_min = min(df_history['Close'])
+        y_max = max(df_history['Close'])
+        # Weekly/monthly bars when the daily ones do not fit in the point budget
+        df_bars = resample_ohlc(df_history, max_points)
+        fig = go.Figure(data=[go.Candlestick(x=df_bars['Date'],
+                                             open=df_bars['Open'],
+                                             high=df_bars['High'],
+                                             low=df_bars['Low'],
+                                             close=df_bars['Close'],
+                                             visible=True
+                                             )])
+        fig.update_layout(title='Stock Price History',
+                          title_x=0.5,
+                          yaxis=dict(range=[y_min*RANGE_FACTORS['candlestick'][0], y_max*RANGE_FACTORS['candlestick'][1]]),
+                          template="plotly_white",
+                          colorway=['#f44336', '#3f51b5', '#2196f3', '#009688', '#4caf50'],
+                          font=dict(family='roboto', size=12),
+                          #paper_bgcolor='#F5F5F5',
+                          plot_bgcolor='#F5F5F5',
+                          #plot_bgcolor='black',
+                          xaxis_rangeslider_visible=False,
+                          margin=dict(l=50, r=50, b=50, t=50, pad=4))
+        # Add an annotation for the minimum value
+        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmin()], y=y_min,
+                           text=f"Min: {y_min:.2f}", showarrow=True, arrowhead=7, arrowsize=2, font=dict(family='roboto', size=16, color='red'))
+        # Add an annotation for the maximum value
+        fig.add_annotation(x=df_history['Date'][df_history['Close'].idxmax()], y=y_max,
+                           text=f"Max: {y_max:.2f}", showarrow=True, arrowhead=7, arrowsize=2, font=dict(family='roboto', size=16, color='green'))
+
+    return fig
+
+
+# Close prices of several symbols rebased to 100 on their first day, one line per symbol
+@timed('figure')
+def build_comparison_figure(histories, max_points=CHART_MAX_POINTS):
+    fig = go.Figure()
+    for symbol, df_history in histories.items():
+        df_line = downsample_line(df_history, max_points)
+        fig.add_trace(go.Scatter(x=df_line['Date'], y=df_line['Close'] / df_history['Close'].iloc[0] * 100,
+                                 mode='lines', name=symbol))
+    fig.add_hline(y=100, line_dash='dot', line_color='grey')
+    fig.update_layout(title='Performance Comparison (rebased to 100)',
+                      title_x=0.5,
+                      template="plotly_white",
+                      font=dict(family='roboto', size=12),
+                      plot_bgcolor='#F5F5F5',
+                      hovermode='x unified',
+                      margin=dict(l=50, r=50, b=50, t=50, pad=4))
+    return fig
+
+
+# Trace, layout and annotations of both charts without their data, for the clientside rendering (assets/charts.js)
+def chart_config(max_points=CHART_MAX_POINTS):
+    day = datetime.date.today()
+    df_dummy = pd.DataFrame({'Date': [day, day + datetime.timedelta(days=1)],
+                             'Open': [1.0, 1.0], 'High': [1.0, 1.0], 'Low': [1.0, 1.0], 'Close': [1.0, 2.0]})
+    config = {'max_points': max_points, 'resample_rules': RESAMPLE_RULES}
+    for chart in ('line', 'candlestick'):
+        fig = json.loads(build_figure(df_dummy, chart, 'green').to_json())
+        trace = {key: value for key, value in fig['data'][0].items()
+                 if key not in ('x', 'y', 'open', 'high', 'low', 'close')}
+        layout = fig['layout']
+        annotations = [{key: value for key, value in annotation.items() if key not in ('x', 'y', 'text')}
+                       for annotation in layout.pop('annotations')]
+        layout['yaxis'].pop('range', None)
+        config[chart] = {'trace': trace, 'layout': layout, 'annotations': annotations,
+                         'range_factors': RANGE_FACTORS[chart]}
+    return config
@@ -0,0 +1,91 @@
+import os
+
+# Base folder of the app (gunicorn runs with --chdir src, but keep paths absolute anyway)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Local data folder (price history store, caches ...)
+DATA_DIR = os.environ.get('NAYA_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Price history store
+HISTORY_PERIOD = '5y'
+HISTORY_YEARS = 5
+PRICE_STORE_DIR = os.path.join(DATA_DIR, 'prices')
+# Seconds before a stored history is considered stale and the newest bars are fetched again
+PRICE_STORE_MAX_AGE = int(os.environ.get('PRICE_STORE_MAX_AGE', 60 * 60))
+# Size cap of the store on disk, least recently used symbols are evicted above it
+PRICE_STORE_MAX_BYTES = int(os.environ.get('PRICE_STORE_MAX_MB', 200)) * 1024 * 1024
+# Hot tier of the recently used histories as flat array files, memory-mapped by every worker
+# (point HOT_TIER_DIR to /dev/shm/... to keep it in shared memory), and its size cap
+HOT_TIER_DIR = os.environ.get('HOT_TIER_DIR', os.path.join(DATA_DIR, 'hot'))
+HOT_TIER_MAX_BYTES = int(os.environ.get('HOT_TIER_MAX_MB', 64)) * 1024 * 1024
+
+# Source of the daily bars: yfinance, local (folder of <symbol>.csv/.parquet files) or synthetic (random walks)
+PRICE_PROVIDER = os.environ.get('PRICE_PROVIDER', 'yfinance')
+PRICE_PROVIDER_DIR = os.environ.get('PRICE_PROVIDER_DIR', os.path.join(DATA_DIR, 'provider'))
+# Concurrent upstream downloads of a bulk fetch
+PRICE_PROVIDER_WORKERS = int(os.environ.get('PRICE_PROVIDER_WORKERS', 8))
+SYNTHETIC_SEED = int(os.environ.get('SYNTHETIC_SEED', 0))
+# Outbound HTTP requests of the provider, for all the workers of the host: token bucket (requests per second and
+# burst), seconds a request may wait for a token, and retries with exponential backoff of throttled/failed requests
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', 5))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', 10))
+UPSTREAM_MAX_WAIT = float(os.environ.get('UPSTREAM_MAX_WAIT', 15))
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 3))
+UPSTREAM_BACKOFF = float(os.environ.get('UPSTREAM_BACKOFF', 0.5))
+UPSTREAM_BUCKET_FILE = os.path.join(DATA_DIR, 'upstream.bucket')
+# Seconds a symbol whose fetch failed is not requested again, by any worker (its stale bars are shown)
+UPSTREAM_FAILURE_TTL = float(os.environ.get('UPSTREAM_FAILURE_TTL', 5 * 60))
+# Seconds a request waits for the fetch of the same symbol by another request before it shows the stale bars
+PRICE_LOCK_WAIT = float(os.environ.get('PRICE_LOCK_WAIT', 5))
+# Lock files of the symbol fetches, a fixed number of them shared by the symbols (outside the price store)
+PRICE_LOCK_DIR = os.path.join(DATA_DIR, 'locks')
+PRICE_LOCK_SLOTS = int(os.environ.get('PRICE_LOCK_SLOTS', 256))
+
+# Batch signals of every symbol (batch_signals.py), read by the screener table
+SIGNALS_FILE = os.environ.get('SIGNALS_FILE', os.path.join(DATA_DIR, 'signals.ndjson'))
+
+# Live mode: indicator states saved per symbol and refresh interval of the chart
+INDICATOR_STATE_DIR = os.path.join(DATA_DIR, 'indicator_state')
+LIVE_REFRESH_SECONDS = int(os.environ.get('LIVE_REFRESH_SECONDS', 60))
+
+# Prebuilt symbol catalog (python stocks_import.py), loaded instead of rebuilding it in every worker
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', os.path.join(DATA_DIR, 'catalog.pkl'))
+
+# Point budget of a chart trace, longer ranges are downsampled (line) or resampled to weekly/monthly bars (candlestick)
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 600))
+
+# Memoized figures and recommendation tables, shared by the gunicorn workers through files
+# (point MEMO_CACHE_DIR to /dev/shm/... to keep them in shared memory)
+MEMO_CACHE_DIR = os.environ.get('MEMO_CACHE_DIR', os.path.join(DATA_DIR, 'memo'))
+MEMO_CACHE_MAX_ENTRIES = int(os.environ.get('MEMO_CACHE_MAX_ENTRIES', 2000))
+MEMO_CACHE_TTL = int(os.environ.get('MEMO_CACHE_TTL', 60 * 60))
+
+# Background prefetch of the selected index stocks and refresh of the most viewed ones
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', '1') == '1'
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 2))
+PREFETCH_REFRESH_SECONDS = int(os.environ.get('PREFETCH_REFRESH_SECONDS', 5 * 60))
+PREFETCH_TOP_SYMBOLS = int(os.environ.get('PREFETCH_TOP_SYMBOLS', 20))
+# Queued symbols fetched together in one bulk provider request
+PREFETCH_BATCH = int(os.environ.get('PREFETCH_BATCH', 20))
+
+# Timing histograms of the spans (seconds) served on /metrics, and Server-Timing headers of the callbacks
+METRICS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+# Requests slower than this (seconds) get their sampled stacks saved to PROFILE_DIR, 0 turns the profiler off
+PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', 0))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+
+# Backtest: days after a Buy/Sell that decide whether it was a hit, and size cap (array cells) of a sweep chunk
+BACKTEST_HORIZON = int(os.environ.get('BACKTEST_HORIZON', 20))
+SWEEP_MAX_CELLS = int(os.environ.get('SWEEP_MAX_CELLS', 4_000_000))
+
+# Peer comparison: trading days of returns compared between the stocks of an industry
+PEER_WINDOW_DAYS = int(os.environ.get('PEER_WINDOW_DAYS', 252))
+
+# Search-as-you-type of the symbol dropdowns: options sent for a search
+SYMBOL_SEARCH_RESULTS = int(os.environ.get('SYMBOL_SEARCH_RESULTS', 20))
+
+# Comparison chart: symbols overlaid at most, concurrent history loads of a worker and seconds allowed per symbol
+COMPARE_MAX_SYMBOLS = int(os.environ.get('COMPARE_MAX_SYMBOLS', 10))
+COMPARE_WORKERS = int(os.environ.get('COMPARE_WORKERS', 10))
+COMPARE_TIMEOUT = float(os.environ.get('COMPARE_TIMEOUT', 10))
@@ -0,0 +1,187 @@
+import datetime
+import hashlib
+import json
+import os
+
+import flask
+import pandas as pd
+
+from analysis_func import latest_signals
+from batch_signals import SIGNAL_COLUMNS, SIGNALS_FRAME_COLUMNS, read_signals
+from catalog_index import MAIN_TABLE_COLUMNS, get_catalog_index
+from config import SIGNALS_FILE
+from metrics import timed
+from server_store import get_symbol_arrays
+from stocks_import import catalog_version
+
+# Read-only data of the dashboard for scripts and internal tools, behind the same login as the app:
+#   GET /api/v1/catalog[?index=DAX]
+#   GET /api/v1/history/<symbol>[?start=2023-01-01&end=2023-12-31]
+#   GET /api/v1/signals/<symbol>
+#   GET /api/v1/index/<index>/signals      (NDJSON stream by default)
+# ?format=json|ndjson|arrow (or the Accept header) picks the format; every response carries an ETag
+# from the data version, a poll with If-None-Match gets 304 Not Modified while the data is the same.
+
+# Rows serialized at a time in the NDJSON streams
+STREAM_CHUNK_ROWS = 500
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+FORMATS = {'json': 'application/json', 'ndjson': NDJSON_MIMETYPE, 'arrow': ARROW_MIMETYPE}
+
+api = flask.Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _etag(*parts):
+    return hashlib.sha1('/'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _response_format(default='json'):
+    requested = flask.request.args.get('format')
+    if requested is None:
+        # The default wins ties, so 'Accept: */*' gets it
+        mimetypes = [FORMATS[default]] + [mimetype for mimetype in FORMATS.values() if mimetype != FORMATS[default]]
+        best = flask.request.accept_mimetypes.best_match(mimetypes, default=FORMATS[default])
+        requested = next(name for name, mimetype in FORMATS.items() if mimetype == best)
+    if requested not in FORMATS:
+        flask.abort(400, f'Unknown format {requested!r}, expected one of {sorted(FORMATS)}')
+    return requested
+
+
+# JSON values of the frame: days as ISO strings, NaN as null
+def _records(df):
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+# One JSON line per row, serialized chunk by chunk while the response is sent
+def _ndjson_lines(df):
+    for start in range(0, len(df), STREAM_CHUNK_ROWS):
+        for record in _records(df.iloc[start: start + STREAM_CHUNK_ROWS]):
+            yield json.dumps(record) + '\n'
+
+
+def _arrow_bytes(df):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        flask.abort(406, 'Arrow responses need pyarrow (pip install pyarrow)')
+    # Arrow columns have one type: mixed columns of the catalog ('Year of Founded': years, '' and
+    # 'unknown') are sent as strings
+    df = df.apply(lambda col: col.astype(str) if col.dtype == object and col.map(type).nunique() > 1 else col)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Days as date32, not timestamps
+    for number, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(number, field.name, table.column(number).cast(pa.date32()))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# The frame as JSON, NDJSON (streamed row by row) or Arrow IPC, with the ETag of the data version;
+# nothing is serialized when the client already has this version
+def _table_response(df, etag, default_format='json'):
+    response_format = _response_format(default_format)
+    # The format is part of the representation
+    etag = _etag(etag, response_format)
+    if flask.request.if_none_match.contains(etag):
+        response = flask.Response(status=304)
+    elif response_format == 'arrow':
+        response = flask.Response(_arrow_bytes(df), mimetype=ARROW_MIMETYPE)
+    elif response_format == 'ndjson':
+        response = flask.Response(_ndjson_lines(df), mimetype=NDJSON_MIMETYPE)
+    else:
+        response = flask.jsonify(_records(df))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        flask.abort(400, f'{name} must be a YYYY-MM-DD date')
+
+
+@api.route('/catalog')
+@timed('api.catalog')
+def catalog():
+    index = flask.request.args.get('index')
+    catalog_index = get_catalog_index()
+    if index is None:
+        df = pd.concat([catalog_index.frame(name) for name in catalog_index.index_frames], ignore_index=True)
+    elif index in catalog_index.index_frames:
+        df = catalog_index.frame(index)
+    else:
+        flask.abort(404, f'Unknown stock index {index!r}')
+    return _table_response(df[MAIN_TABLE_COLUMNS], _etag('catalog', catalog_version(), index))
+
+
+def _symbol_arrays(symbol):
+    arrays = get_symbol_arrays(symbol)
+    if len(arrays) == 0:
+        flask.abort(404, f'No price history for {symbol!r}')
+    return arrays
+
+
+@api.route('/history/<path:symbol>')
+@timed('api.history')
+def history(symbol):
+    start = flask.request.args.get('start')
+    end = flask.request.args.get('end')
+    arrays = _symbol_arrays(symbol).between(start and _parse_date(start, 'start'), end and _parse_date(end, 'end'))
+    return _table_response(arrays.frame(), _etag('history', symbol, arrays.version, start, end))
+
+
+@api.route('/signals/<path:symbol>')
+@timed('api.signals')
+def signals(symbol):
+    arrays = _symbol_arrays(symbol)
+    close = arrays['Close']
+    # Same columns as the batch signals of /index/<index>/signals
+    record = {'Symbol': symbol, 'Date': str(arrays.dates()[-1]), 'Last Close': round(float(close[-1]), 2)}
+    for name, value in latest_signals(close).items():
+        record[SIGNAL_COLUMNS[name]] = value
+    df = pd.DataFrame([record], columns=SIGNALS_FRAME_COLUMNS)
+    return _table_response(df, _etag('signals', symbol, arrays.version))
+
+
+# Batch signals of every stock of the index (batch_signals.py), versioned by the batch output file
+@api.route('/index/<path:index>/signals')
+@timed('api.index_signals')
+def index_signals(index):
+    catalog_index = get_catalog_index()
+    if index not in catalog_index.index_frames:
+        flask.abort(404, f'Unknown stock index {index!r}')
+    symbols = [option['value'] for option in catalog_index.symbol_options(index)]
+    try:
+        stat = os.stat(SIGNALS_FILE)
+        file_version = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        file_version = None
+    df = read_signals()
+    df = df[df['Symbol'].isin(symbols)]
+    return _table_response(df, _etag('index-signals', index, file_version), default_format='ndjson')
+
+
+# Errors as JSON, so scripts do not get the HTML error pages
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(406)
+def error(exception):
+    return flask.jsonify({'error': exception.description}), exception.code
+
+
+# Register the API behind the login of the app (auth: the dash_auth.BasicAuth of the app)
+def init_api(server, auth):
+    @api.before_request
+    def require_login():
+        if not auth.is_authorized():
+            return auth.login_request()
+
+    server.register_blueprint(api)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# Coarser bars tried in turn until a candlestick range fits in the point budget
+RESAMPLE_RULES = ['W-FRI', 'M', 'Q', 'A']
+
+
+# Largest-Triangle-Three-Buckets: indices of n_out points keeping the visual shape of the (x, y) line
+def lttb(x, y, n_out, keep=()):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # First and last points are kept, the others are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average point of the next bucket (the last point for the last bucket)
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Point of the bucket making the largest triangle with the previous selected point and the next average
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    # Points that must stay (min/max of the annotations)
+    return np.union1d(selected, np.asarray(keep, dtype=np.int64))
+
+
+# Line chart data within the point budget, the min/max close points are always kept
+def downsample_line(df_history, max_points):
+    if len(df_history) <= max_points:
+        return df_history
+    close = df_history['Close'].to_numpy()
+    days = pd.to_datetime(df_history['Date']).values.astype('datetime64[D]').astype(np.int64)
+    keep = [np.nanargmin(close), np.nanargmax(close)]
+    return df_history.iloc[lttb(days, close, max_points - len(keep), keep=keep)]
+
+
+# Candlestick data within the point budget: daily bars are resampled to weekly, monthly ... bars
+def resample_ohlc(df_history, max_points):
+    if len(df_history) <= max_points:
+        return df_history
+    dates = pd.to_datetime(df_history['Date'])
+    for rule in RESAMPLE_RULES:
+        periods = dates.dt.to_period(rule)
+        if periods.nunique() <= max_points:
+            break
+    bars = df_history.groupby(periods.to_numpy(), sort=True).agg(Date=('Date', 'last'), Open=('Open', 'first'),
+                                                               High=('High', 'max'), Low=('Low', 'min'),
+                                                               Close=('Close', 'last'), Volume=('Volume', 'sum'))
+    return bars.reset_index(drop=True)
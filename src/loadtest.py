@@ -0,0 +1,521 @@
+# Load test of the Dash callbacks through gunicorn, offline:
+#   python loadtest.py [--workers 2] [--users 8] [--duration 30] [--warmup 5] [--output loadtest.json]
+#   python loadtest.py --url http://127.0.0.1:8050/ --users 4     (against a running server, no RSS report)
+# Starts `gunicorn --preload app:server` with synthetic prices (PRICE_PROVIDER=synthetic, fixed seed), a fixed
+# catalog snapshot in a temporary data folder and outbound connections disabled in the workers. Every user
+# replays browser sessions (page load, index change, symbol search and change, chart toggle, range change): the
+# _dash-update-component POSTs the renderer would send, read from /_dash-dependencies, chained callbacks
+# included. Reports the throughput, p50/p95/p99 latency per interaction and per callback, and the RSS per worker.
+import argparse
+import datetime
+import json
+import os
+import random
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Before the app modules read the config
+if 'NAYA_DATA_DIR' not in os.environ:
+    os.environ['NAYA_DATA_DIR'] = TEMP_DATA_DIR = tempfile.mkdtemp(prefix='naya-load-')
+else:
+    TEMP_DATA_DIR = None
+os.environ.setdefault('PRICE_PROVIDER', 'synthetic')
+os.environ.setdefault('PREFETCH_ENABLED', '0')
+
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+
+from config import BASE_DIR, CATALOG_SNAPSHOT, DATA_DIR  # noqa: E402
+
+PERCENTILES = [50, 95, 99]
+# Parallel requests of a browser to one host
+BROWSER_CONNECTIONS = 6
+STARTUP_TIMEOUT_SECONDS = 120
+RSS_SAMPLE_SECONDS = 1.0
+# Symbols looked at per session, and share of them after an index change
+SESSION_SYMBOLS = (3, 8)
+INDEX_CHANGE_SHARE = 0.2
+CHART_TOGGLE_SHARE = 0.5
+RANGE_CHANGE_SHARE = 0.7
+# Days shown after a range change, None for the whole stored window
+RANGE_DAYS = [30, 91, 182, 365, 3 * 365, None]
+# Characters typed in the symbol dropdown before picking
+SEARCH_KEYSTROKES = (1, 4)
+
+# gunicorn with connections to anything but the loopback refused (the workers fork from this interpreter)
+OFFLINE_GUNICORN = """
+import socket
+import sys
+_connect = socket.socket.connect
+def _loopback_only(sock, address):
+    if sock.family in (socket.AF_INET, socket.AF_INET6) and address[0] not in ('127.0.0.1', '::1', 'localhost'):
+        raise RuntimeError(f'network call to {address[0]} during the load test')
+    return _connect(sock, address)
+socket.socket.connect = _loopback_only
+from gunicorn.app.wsgiapp import run
+sys.argv[0] = 'gunicorn'
+sys.exit(run())
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# The catalog snapshot of the run: a copy of the given one, or built from the installed pytickersymbols
+def prepare_catalog(catalog_path):
+    if catalog_path:
+        os.makedirs(os.path.dirname(os.path.abspath(CATALOG_SNAPSHOT)), exist_ok=True)
+        shutil.copyfile(catalog_path, CATALOG_SNAPSHOT)
+    from stocks_import import get_catalog
+
+    get_catalog()
+
+
+def start_server(workers, port, extra_args, log_path):
+    command = [sys.executable, '-c', OFFLINE_GUNICORN, '--chdir', BASE_DIR, '--preload',
+               '--workers', str(workers), '--bind', f'127.0.0.1:{port}', *extra_args, 'app:server']
+    with open(log_path, 'w') as log_file:
+        return subprocess.Popen(command, cwd=BASE_DIR, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, auth, process=None):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            if requests.get(url + '_dash-layout', auth=auth, timeout=5).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server not ready within {STARTUP_TIMEOUT_SECONDS}s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# Kilobytes of the /proc fields of the process (VmRSS from status, Pss from smaps_rollup), {} once it is gone
+def _proc_memory(pid):
+    memory = {}
+    for name, fields in [('status', ['VmRSS']), ('smaps_rollup', ['Pss'])]:
+        try:
+            with open(f'/proc/{pid}/{name}') as proc_file:
+                for line in proc_file:
+                    key, _, value = line.partition(':')
+                    if key in fields:
+                        memory[key] = int(value.split()[0])
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return memory
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat_file:
+                # pid (comm) state ppid ...; comm may hold spaces
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+# RSS and PSS of the gunicorn master and its workers, sampled in the background: last and peak per pid
+class MemorySampler:
+    def __init__(self, master_pid):
+        self.master_pid = master_pid
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        for pid in [self.master_pid, *_children(self.master_pid)]:
+            memory = _proc_memory(pid)
+            if 'VmRSS' not in memory:
+                continue
+            entry = self.samples.setdefault(pid, {'role': 'master' if pid == self.master_pid else 'worker',
+                                                  'peak_rss_kb': 0})
+            entry['rss_kb'] = memory['VmRSS']
+            entry['pss_kb'] = memory.get('Pss')
+            entry['peak_rss_kb'] = max(entry['peak_rss_kb'], memory['VmRSS'])
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def _prop_id(component_id, prop):
+    return f'{component_id}.{prop}'
+
+
+# Server callbacks of /_dash-dependencies: output string, outputs, inputs and states as (id, prop)
+def parse_dependencies(dependencies):
+    callbacks = []
+    for dependency in dependencies:
+        if dependency.get('clientside_function'):
+            continue
+        output = dependency['output']
+        multi = output.startswith('..')
+        parts = output[2:-2].split('...') if multi else [output]
+        callbacks.append({'output': output, 'multi': multi,
+                          'outputs': [tuple(part.rsplit('.', 1)) for part in parts],
+                          'inputs': [(item['id'], item['property']) for item in dependency['inputs']],
+                          'state': [(item['id'], item['property']) for item in dependency['state']],
+                          'initial': not dependency.get('prevent_initial_call')})
+    return callbacks
+
+
+# (id, prop) -> value of every component with an id in the layout
+def layout_props(node, props=None):
+    props = {} if props is None else props
+    if isinstance(node, list):
+        for child in node:
+            layout_props(child, props)
+    elif isinstance(node, dict) and 'props' in node:
+        component_id = node['props'].get('id')
+        for prop, value in node['props'].items():
+            if component_id is not None and isinstance(component_id, str) and prop != 'id':
+                props[(component_id, prop)] = value
+            if isinstance(value, (dict, list)):
+                layout_props(value, props)
+    return props
+
+
+# Latencies of the interactions and of the callback requests, from every user
+class Recorder:
+    def __init__(self):
+        self.interactions = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def interaction(self, name, started, elapsed, requests_sent, failed):
+        with self._lock:
+            self.interactions.append((name, started, elapsed, requests_sent, failed))
+
+    def request(self, output, started, elapsed, status):
+        with self._lock:
+            self.requests.append((output, started, elapsed, status))
+
+
+# One browser tab: the props of the page, changed through the callbacks the renderer would call
+class DashClient:
+    def __init__(self, url, auth, recorder, pool):
+        self.url = url
+        self.recorder = recorder
+        self.pool = pool
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.callbacks = []
+        self.props = {}
+
+    def _post(self, callback, changed):
+        body = {'output': callback['output'],
+                'outputs': [{'id': component_id, 'property': prop} for component_id, prop in callback['outputs']],
+                'inputs': [{'id': component_id, 'property': prop, 'value': self.props.get((component_id, prop))}
+                           for component_id, prop in callback['inputs']],
+                'state': [{'id': component_id, 'property': prop, 'value': self.props.get((component_id, prop))}
+                          for component_id, prop in callback['state']],
+                'changedPropIds': [_prop_id(*key) for key in callback['inputs'] if key in changed]}
+        if not callback['multi']:
+            body['outputs'] = body['outputs'][0]
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.url + '_dash-update-component', json=body, timeout=60)
+            status = response.status_code
+            updates = response.json()['response'] if status == 200 else {}
+        except (requests.RequestException, ValueError, KeyError):
+            status, updates = None, {}
+        self.recorder.request(callback['output'], time.time(), time.perf_counter() - started, status)
+        return status, updates
+
+    # Call the triggered callbacks as the renderer does: in waves, a callback waits for the pending callbacks
+    # that output one of its inputs; the props set by a wave trigger the next callbacks
+    def _run_callbacks(self, pending):
+        requests_sent, failed = 0, False
+        while pending:
+            outputs = {key: index for index in pending for key in self.callbacks[index]['outputs']}
+            # (all of them in a loop of callbacks)
+            ready = [index for index in pending
+                     if not any(outputs.get(key, index) != index for key in self.callbacks[index]['inputs'])]
+            ready = ready or list(pending)
+            futures = [(index, self.pool.submit(self._post, self.callbacks[index], pending[index])) for index in ready]
+            for index, _ in futures:
+                del pending[index]
+            for index, future in futures:
+                status, updates = future.result()
+                requests_sent += 1
+                failed = failed or status not in (200, 204)
+                for component_id, props in updates.items():
+                    for prop, value in props.items():
+                        self.props[(component_id, prop)] = value
+                        self._trigger(pending, {(component_id, prop)})
+        return requests_sent, failed
+
+    def _trigger(self, pending, changed):
+        for index, callback in enumerate(self.callbacks):
+            triggered = changed.intersection(callback['inputs'])
+            if triggered:
+                pending.setdefault(index, set()).update(triggered)
+
+    def _record(self, name, started, wall_started, result):
+        requests_sent, failed = result
+        self.recorder.interaction(name, wall_started, time.perf_counter() - started, requests_sent, failed)
+
+    # Page load: the layout and dependencies, then every callback without prevent_initial_call
+    def load(self):
+        wall_started, started = time.time(), time.perf_counter()
+        try:
+            layout = self.session.get(self.url + '_dash-layout', timeout=60)
+            dependencies = self.session.get(self.url + '_dash-dependencies', timeout=60)
+            layout.raise_for_status()
+            dependencies.raise_for_status()
+        except requests.RequestException:
+            self._record('load', started, wall_started, (2, True))
+            return False
+        self.callbacks = parse_dependencies(dependencies.json())
+        self.props = layout_props(layout.json())
+        pending = {index: set() for index, callback in enumerate(self.callbacks) if callback['initial']}
+        self._record('load', started, wall_started, self._run_callbacks(pending))
+        return True
+
+    # A user changing props of the page (changes: (id, prop) -> value)
+    def interact(self, name, changes):
+        wall_started, started = time.time(), time.perf_counter()
+        self.props.update(changes)
+        pending = {}
+        self._trigger(pending, set(changes))
+        self._record(name, started, wall_started, self._run_callbacks(pending))
+
+
+def _option_values(client, component_id):
+    return [option['value'] for option in client.props.get((component_id, 'options')) or []]
+
+
+# Type the start of a listed company name in the symbol dropdown, then pick its symbol
+def choose_symbol(client, rng):
+    options = client.props.get(('symbol-dropdown', 'options')) or []
+    if not options:
+        return
+    target = rng.choice(options)
+    name = target['label'].split(' - ', 1)[-1]
+    for length in range(1, rng.randint(*SEARCH_KEYSTROKES) + 1):
+        client.interact('search', {('symbol-dropdown', 'search_value'): name[:length].lower()})
+    values = _option_values(client, 'symbol-dropdown')
+    symbol = target['value'] if target['value'] in values or not values else values[0]
+    # The dropdown clears its search when an option is picked
+    client.interact('symbol', {('symbol-dropdown', 'value'): symbol, ('symbol-dropdown', 'search_value'): ''})
+
+
+def change_index(client, rng):
+    current = client.props.get(('index-dropdown', 'value'))
+    indexes = [index for index in _option_values(client, 'index-dropdown') if index != current]
+    if indexes:
+        client.interact('index', {('index-dropdown', 'value'): rng.choice(indexes)})
+
+
+def toggle_chart(client, rng):
+    current = client.props.get(('filter-charts', 'value'))
+    charts = [chart for chart in _option_values(client, 'filter-charts') if chart != current]
+    if charts:
+        client.interact('chart', {('filter-charts', 'value'): rng.choice(charts)})
+
+
+def change_range(client, rng):
+    first = client.props.get(('date-range-picker', 'min_date_allowed'))
+    last = client.props.get(('date-range-picker', 'max_date_allowed')) or datetime.date.today().isoformat()
+    days = rng.choice(RANGE_DAYS)
+    end = datetime.date.fromisoformat(last[:10])
+    start = first[:10] if days is None or first is None else \
+        max(first[:10], (end - datetime.timedelta(days=days)).isoformat())
+    client.interact('range', {('date-range-picker', 'start_date'): start,
+                              ('date-range-picker', 'end_date'): end.isoformat()})
+
+
+# Sessions of one user until the stop time: a page load, then a few symbols, each looked at with the
+# other charts and ranges
+def run_user(url, auth, recorder, seed, stop_at, think):
+    rng = random.Random(seed)
+    with ThreadPoolExecutor(BROWSER_CONNECTIONS) as pool:
+        while time.time() < stop_at:
+            client = DashClient(url, auth, recorder, pool)
+            if not client.load():
+                time.sleep(1)
+                continue
+            for _ in range(rng.randint(*SESSION_SYMBOLS)):
+                steps = [change_index] if rng.random() < INDEX_CHANGE_SHARE else []
+                steps.append(choose_symbol)
+                if rng.random() < CHART_TOGGLE_SHARE:
+                    steps.append(toggle_chart)
+                if rng.random() < RANGE_CHANGE_SHARE:
+                    steps.append(change_range)
+                for step in steps:
+                    if time.time() >= stop_at:
+                        return
+                    step(client, rng)
+                    if think:
+                        time.sleep(rng.uniform(0, 2 * think))
+
+
+def _latency_summary(latencies):
+    values = np.array(latencies) * 1000
+    summary = {'count': len(values)}
+    if len(values):
+        summary.update({f'p{p}_ms': round(float(np.percentile(values, p)), 2) for p in PERCENTILES})
+        summary['max_ms'] = round(float(values.max()), 2)
+    return summary
+
+
+# Throughput and latency percentiles of what started after the warmup
+def summarize(recorder, measured_from, measured_seconds):
+    interactions = [row for row in recorder.interactions if row[1] >= measured_from]
+    sent = [row for row in recorder.requests if row[1] >= measured_from]
+    summary = {'seconds': round(measured_seconds, 2),
+               'interactions_per_second': round(len(interactions) / measured_seconds, 2),
+               'requests_per_second': round(len(sent) / measured_seconds, 2),
+               'interactions': {}, 'callbacks': {}}
+    for name in dict.fromkeys(row[0] for row in interactions):
+        rows = [row for row in interactions if row[0] == name]
+        summary['interactions'][name] = {
+            **_latency_summary([row[2] for row in rows if not row[4]]),
+            'errors': sum(1 for row in rows if row[4]),
+            'requests_per_interaction': round(sum(row[3] for row in rows) / len(rows), 2)}
+    for output in sorted(dict.fromkeys(row[0] for row in sent)):
+        rows = [row for row in sent if row[0] == output]
+        summary['callbacks'][output] = {**_latency_summary([row[2] for row in rows if row[3] in (200, 204)]),
+                                        'errors': sum(1 for row in rows if row[3] not in (200, 204))}
+    return summary
+
+
+# 'stock-table.data (+1)' for the output '..stock-table.data...stock-table.page_count..'
+def _short_output(output):
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    return parts[0] if len(parts) == 1 else f'{parts[0]} (+{len(parts) - 1})'
+
+
+def _print_table(title, rows):
+    print(f'\n{title:48}{"count":>8}{"errors":>8}' + ''.join(f'{f"p{p} ms":>10}' for p in PERCENTILES))
+    for name, row in rows.items():
+        name = _short_output(name)
+        print(f'{name[:47]:48}{row["count"]:8}{row["errors"]:8}'
+              + ''.join(f'{row.get(f"p{p}_ms", float("nan")):10.1f}' for p in PERCENTILES))
+
+
+def report(summary, memory):
+    print(f'\n{summary["interactions_per_second"]:.1f} interactions/s, {summary["requests_per_second"]:.1f} '
+          f'callback requests/s over {summary["seconds"]:.0f}s')
+    _print_table('Interaction', summary['interactions'])
+    _print_table('Callback (output)', summary['callbacks'])
+    if memory:
+        print(f'\n{"Process":16}{"RSS MB":>10}{"peak MB":>10}{"PSS MB":>10}')
+        for pid, entry in sorted(memory.items(), key=lambda item: item[1]['role']):
+            pss = entry['pss_kb'] / 1024 if entry.get('pss_kb') is not None else float('nan')
+            print(f'{entry["role"] + " " + str(pid):16}{entry["rss_kb"] / 1024:10.1f}'
+                  f'{entry["peak_rss_kb"] / 1024:10.1f}{pss:10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the Dash callbacks, offline')
+    parser.add_argument('--url', help='Base URL of a running app, instead of starting gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--gunicorn-args', default='', help='More gunicorn arguments, e.g. "--threads 4"')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent users')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+    parser.add_argument('--warmup', type=float, default=5, help='First seconds left out of the results')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean seconds between the actions of a user')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the user sessions')
+    parser.add_argument('--catalog', help='Catalog snapshot to serve (default: built from pytickersymbols)')
+    parser.add_argument('--username', default='naya')
+    parser.add_argument('--password', default='naya')
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args()
+
+    auth = (args.username, args.password)
+    process = sampler = None
+    try:
+        if args.url:
+            url = args.url if args.url.endswith('/') else args.url + '/'
+        else:
+            print(f'Data folder: {DATA_DIR}')
+            prepare_catalog(args.catalog)
+            port = _free_port()
+            url = f'http://127.0.0.1:{port}/'
+            process = start_server(args.workers, port, shlex.split(args.gunicorn_args),
+                                   os.path.join(DATA_DIR, 'gunicorn.log'))
+        wait_ready(url, auth, process)
+        if process is not None:
+            sampler = MemorySampler(process.pid)
+            sampler.start()
+
+        print(f'{args.users} users for {args.duration:g}s (warmup {args.warmup:g}s) against {url}')
+        recorder = Recorder()
+        started = time.time()
+        stop_at = started + args.duration
+        users = [threading.Thread(target=run_user, args=(url, auth, recorder, args.seed * 1000 + user, stop_at,
+                                                         args.think))
+                 for user in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        measured_from = started + min(args.warmup, args.duration)
+        summary = summarize(recorder, measured_from, max(time.time() - measured_from, 1e-9))
+        if sampler is not None:
+            sampler.stop()
+    except RuntimeError as error:
+        print(error)
+        if process is not None:
+            with open(os.path.join(DATA_DIR, 'gunicorn.log')) as log_file:
+                print(''.join(log_file.readlines()[-20:]))
+        sys.exit(1)
+    finally:
+        if process is not None:
+            stop_server(process)
+        if TEMP_DATA_DIR:
+            shutil.rmtree(TEMP_DATA_DIR, ignore_errors=True)
+
+    memory = sampler.samples if sampler is not None else {}
+    report(summary, memory)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as json_file:
+            json.dump({'meta': {'workers': None if args.url else args.workers, 'users': args.users,
+                                'duration': args.duration, 'warmup': args.warmup, 'think': args.think,
+                                'seed': args.seed, 'date': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                       'summary': summary, 'memory': {str(pid): entry for pid, entry in memory.items()}},
+                      json_file, indent=2)
+        print(f'\nResults saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
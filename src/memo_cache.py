@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import time
+
+from config import MEMO_CACHE_DIR, MEMO_CACHE_MAX_ENTRIES, MEMO_CACHE_TTL
+from shared_files import atomic_write, evict_lru, touch
+
+FILE_SUFFIX = '.json'
+# Name -> every SharedCache of the process, for /metrics
+caches = {}
+
+
+# JSON values memoized in files, shared by every worker of the host, with LRU (file mtime) + TTL eviction
+class SharedCache:
+    def __init__(self, name, max_entries=MEMO_CACHE_MAX_ENTRIES, ttl=MEMO_CACHE_TTL, directory=MEMO_CACHE_DIR):
+        self.name = name
+        self.directory = os.path.join(directory, name)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Counters of this worker
+        self.hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.directory, digest + FILE_SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry['created'] >= self.ttl:
+            return None
+        touch(path)
+        return entry
+
+    def set(self, key, value):
+        atomic_write(self._path(key), json.dumps({'created': time.time(), 'value': value},
+                                                 separators=(',', ':')).encode())
+        evict_lru(self.directory, FILE_SUFFIX, max_entries=self.max_entries)
+
+    # Value of the key from the cache, computed (and cached) on a miss; compute must return JSON data
+    def get_or_compute(self, key, compute):
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry['value']
+        self.misses += 1
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    # Entries on disk, shared by the workers
+    def size(self):
+        try:
+            return sum(1 for entry in os.scandir(self.directory) if entry.name.endswith(FILE_SUFFIX))
+        except FileNotFoundError:
+            return 0
+
+
+payload_cache = SharedCache('payloads')
+backtest_cache = SharedCache('backtests')
+peers_cache = SharedCache('peers')
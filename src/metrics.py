@@ -0,0 +1,173 @@
+import bisect
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+import flask
+
+from config import METRICS_BUCKETS, PROFILE_DIR, PROFILE_INTERVAL, PROFILE_SLOW_SECONDS
+from memo_cache import caches
+
+
+# Prometheus-style histogram of durations in seconds (cumulative buckets, sum and count)
+class Histogram:
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def lines(self, metric, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float('+inf')], self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('+inf') else repr(bound)
+            yield f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f'{metric}_sum{{{labels}}} {self.total:.6f}'
+        yield f'{metric}_count{{{labels}}} {self.count}'
+
+
+# Span name -> histogram, of this worker
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name, seconds):
+    with _histograms_lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        _histograms[name].observe(seconds)
+    # Also listed in the Server-Timing header of the current request
+    if flask.has_request_context():
+        flask.g.setdefault('spans', []).append((name, seconds))
+
+
+# Time a named part of the work: with span('figure'): ...
+@contextlib.contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+# Time every call of the function, callbacks get 'callback.<function name>'
+def timed(name=None):
+    def decorator(func):
+        span_name = name or f'callback.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Samples the stacks of the threads serving requests, so slow requests can be saved as collapsed stacks
+# (one 'frame;frame;frame count' line per stack, the input of flamegraph.pl and speedscope)
+class StackSampler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = ';'.join(f'{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})'
+                                         for entry in traceback.extract_stack(frame))
+                        stacks[stack] += 1
+
+
+_sampler = StackSampler() if PROFILE_SLOW_SECONDS else None
+
+
+def _save_profile(stacks, seconds):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{seconds * 1000:.0f}ms.txt')
+    with open(path, 'w') as profile_file:
+        request_data = flask.request.get_json(silent=True) or {}
+        profile_file.write(f'# {flask.request.path} {request_data.get("output", "")}\n')
+        for stack, count in stacks.most_common():
+            profile_file.write(f'{stack} {count}\n')
+
+
+def _before_request():
+    flask.g.started = time.perf_counter()
+    if _sampler is not None and flask.request.path.endswith('_dash-update-component'):
+        _sampler.start(threading.get_ident())
+
+
+def _after_request(response):
+    if not flask.request.path.endswith('_dash-update-component') or 'started' not in flask.g:
+        return response
+    seconds = time.perf_counter() - flask.g.started
+    spans = flask.g.setdefault('spans', [])
+    observe('request', seconds)
+    # Dash dispatch + JSON serialization: the request minus its callback
+    callback_seconds = sum(duration for name, duration in spans if name.startswith('callback.'))
+    observe('serialize', max(seconds - callback_seconds, 0.0))
+    response.headers['Server-Timing'] = ', '.join(f'{name.replace(".", "-")};dur={duration * 1000:.1f}'
+                                                  for name, duration in spans)
+    if _sampler is not None:
+        stacks = _sampler.stop(threading.get_ident())
+        if seconds >= PROFILE_SLOW_SECONDS and stacks:
+            _save_profile(stacks, seconds)
+    return response
+
+
+def metrics_text():
+    pid = os.getpid()
+    lines = ['# HELP naya_span_seconds Duration of the timed spans of this worker',
+             '# TYPE naya_span_seconds histogram']
+    with _histograms_lock:
+        for name, histogram in sorted(_histograms.items()):
+            lines.extend(histogram.lines('naya_span_seconds', f'span="{name}",pid="{pid}"'))
+    lines += ['# HELP naya_cache_requests_total Lookups of the shared caches by this worker',
+              '# TYPE naya_cache_requests_total counter']
+    for name, cache in sorted(caches.items()):
+        for result, count in cache.stats().items():
+            lines.append(f'naya_cache_requests_total{{cache="{name}",result="{result}",pid="{pid}"}} {count}')
+    lines += ['# HELP naya_cache_entries Entries of the shared caches on disk',
+              '# TYPE naya_cache_entries gauge']
+    for name, cache in sorted(caches.items()):
+        lines.append(f'naya_cache_entries{{cache="{name}",pid="{pid}"}} {cache.size()}')
+    return '\n'.join(lines) + '\n'
+
+
+# /metrics (Prometheus text, each worker reports its own histograms) and Server-Timing headers on the
+# callback responses; call it after dash_auth so the scraper does not need the app login
+def init_app(server):
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.add_url_rule('/metrics', 'metrics',
+                        lambda: flask.Response(metrics_text(), mimetype='text/plain; version=0.0.4'))
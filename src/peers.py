@@ -0,0 +1,75 @@
+import hashlib
+
+import numpy as np
+
+from backtest import close_matrix
+from catalog_index import get_catalog_index
+from config import PEER_WINDOW_DAYS
+from memo_cache import peers_cache
+from metrics import timed
+from prefetch import get_scheduler
+from price_store import get_stored_history, stored_version
+
+PEER_COLUMNS = ['Symbol', 'Industry', 'Correlation', 'Beta', 'Return', 'Relative Performance']
+
+
+def _json_matrix(values):
+    return [[None if np.isnan(value) else round(float(value), 4) for value in row] for row in np.atleast_2d(values)]
+
+
+# Correlation, beta and relative performance of every pair of the symbols over the last PEER_WINDOW_DAYS,
+# from one aligned returns matrix (symbols x days, NaN where a symbol has no history yet)
+@timed('peers')
+def peer_matrices(symbols):
+    histories = {symbol: get_stored_history(symbol) for symbol in symbols}
+    symbols = [symbol for symbol in symbols if histories[symbol] is not None and len(histories[symbol]) > 1]
+    if not symbols:
+        return {'symbols': [], 'return': [], 'correlation': [], 'beta': [], 'relative': []}
+    close = close_matrix(symbols, histories)[:, -(PEER_WINDOW_DAYS + 1):]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = close[:, 1:] / close[:, :-1] - 1
+        valid = ~np.isnan(returns)
+        centered = np.where(valid, returns - np.nanmean(np.where(valid, returns, np.nan), axis=1, keepdims=True), 0.0)
+        # Covariance of every pair over the days both have (pairwise complete), as matrix products
+        pair_days = valid.astype(np.float64) @ valid.T.astype(np.float64)
+        covariance = centered @ centered.T / (pair_days - 1)
+        variance = np.diag(covariance)
+        correlation = covariance / np.sqrt(np.outer(variance, variance))
+        # beta[i, j]: beta of symbol i against symbol j
+        beta = covariance / variance[None, :]
+        first = np.take_along_axis(close, np.argmax(~np.isnan(close), axis=1)[:, None], axis=1)[:, 0]
+        total_return = close[:, -1] / first - 1
+        # relative[i, j]: performance of symbol i relative to symbol j
+        relative = (1 + total_return)[:, None] / (1 + total_return)[None, :] - 1
+    return {'symbols': symbols, 'return': _json_matrix(total_return)[0], 'correlation': _json_matrix(correlation),
+            'beta': _json_matrix(beta), 'relative': _json_matrix(relative)}
+
+
+# Peer matrices of the industry, shared by the workers per industry and data version (the stored
+# versions of its stocks); stocks not in the price store yet are left out and fetched in the background
+def industry_peers(industry):
+    symbols = get_catalog_index().industry_symbols.get(industry, [])
+    versions = {symbol: stored_version(symbol) for symbol in symbols}
+    missing = [symbol for symbol, version in versions.items() if version is None]
+    if missing:
+        get_scheduler().warm_symbols(missing)
+    stored = sorted(symbol for symbol, version in versions.items() if version is not None)
+    data_version = hashlib.sha1(';'.join(f'{symbol}:{versions[symbol]}' for symbol in stored).encode()).hexdigest()
+    return peers_cache.get_or_compute([industry, data_version], lambda: peer_matrices(stored))
+
+
+# Rows of the peer panel: the other stocks of the symbol's industries compared to the symbol
+def peer_records(symbol):
+    records = {}
+    for industry in get_catalog_index().industries(symbol):
+        peers = industry_peers(industry)
+        if symbol not in peers['symbols']:
+            continue
+        i = peers['symbols'].index(symbol)
+        for j, peer in enumerate(peers['symbols']):
+            if peer == symbol or peer in records:
+                continue
+            records[peer] = {'Symbol': peer, 'Industry': industry,
+                             'Correlation': peers['correlation'][j][i], 'Beta': peers['beta'][j][i],
+                             'Return': peers['return'][j], 'Relative Performance': peers['relative'][j][i]}
+    return sorted(records.values(), key=lambda record: (record['Correlation'] is None, -(record['Correlation'] or 0)))
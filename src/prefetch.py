@@ -0,0 +1,155 @@
+import itertools
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from config import PREFETCH_ENABLED, PREFETCH_WORKERS, PREFETCH_REFRESH_SECONDS, PREFETCH_TOP_SYMBOLS, \
+    PREFETCH_BATCH, PRICE_STORE_MAX_AGE
+from price_store import refresh_many
+from server_store import get_symbol_arrays, symbol_history_data
+
+# Lower runs first: refresh of the most viewed symbols before the warm-up of a whole index
+REFRESH_PRIORITY = 0
+WARM_PRIORITY = 1
+
+logger = logging.getLogger(__name__)
+
+
+# Warm the shared tiers (price store on disk, hot tier + payload cache) for one symbol; stale data older than
+# max_age is fetched again, so the next request of any worker only reads files
+def warm_symbol(symbol, max_age=PRICE_STORE_MAX_AGE):
+    arrays = get_symbol_arrays(symbol, max_age=max_age)
+    if len(arrays):
+        symbol_history_data(symbol, arrays)
+
+
+# Background threads warming the stocks of the selected index and keeping the most viewed ones refreshed,
+# with at most `workers` upstream fetches at a time
+class PrefetchScheduler:
+    def __init__(self, workers=PREFETCH_WORKERS, refresh_seconds=PREFETCH_REFRESH_SECONDS,
+                 top_symbols=PREFETCH_TOP_SYMBOLS):
+        self.workers = workers
+        self.refresh_seconds = refresh_seconds
+        self.top_symbols = top_symbols
+        self.views = Counter()
+        self._queue = queue.PriorityQueue()
+        # Symbol -> best priority already queued, so a symbol is only queued once
+        self._pending = {}
+        # Symbol -> time.monotonic() of its last warm-up in this process, one entry per catalog symbol at most
+        self._warmed = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'prefetch-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._refresh_loop, name='prefetch-refresh', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def submit(self, symbol, priority=WARM_PRIORITY, max_age=PRICE_STORE_MAX_AGE):
+        with self._lock:
+            if symbol in self._pending and self._pending[symbol] <= priority:
+                return
+            self._pending[symbol] = priority
+        self._queue.put((priority, next(self._order), symbol, max_age))
+
+    # Queue the symbols not warmed by this process within PRICE_STORE_MAX_AGE, every page of an index asks again
+    def warm_symbols(self, symbols):
+        now = time.monotonic()
+        with self._lock:
+            symbols = [symbol for symbol in symbols
+                       if now - self._warmed.get(symbol, -math.inf) >= PRICE_STORE_MAX_AGE]
+        for symbol in symbols:
+            self.submit(symbol)
+
+    def record_view(self, symbol):
+        with self._lock:
+            self.views[symbol] += 1
+
+    def most_viewed(self):
+        with self._lock:
+            return [symbol for symbol, _ in self.views.most_common(self.top_symbols)]
+
+    # Next queued symbols with the same priority and max age, at most PREFETCH_BATCH of them
+    def _next_batch(self):
+        items = [self._queue.get()]
+        while len(items) < PREFETCH_BATCH:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] != items[0][0] or item[3] != items[0][3]:
+                self._queue.put(item)
+                break
+            items.append(item)
+        symbols = []
+        with self._lock:
+            for priority, _, symbol, _ in items:
+                # A better priority of the symbol was queued after this one and did the work already
+                if self._pending.get(symbol) != priority:
+                    continue
+                del self._pending[symbol]
+                symbols.append(symbol)
+        return symbols, items[0][3]
+
+    def _work(self):
+        while True:
+            symbols, max_age = self._next_batch()
+            if not symbols:
+                continue
+            try:
+                # One bulk request for the whole batch, then the per-symbol payloads
+                refresh_many(symbols, max_age)
+            except Exception:
+                logger.exception('Bulk prefetch of %d symbols failed', len(symbols))
+            for symbol in symbols:
+                try:
+                    warm_symbol(symbol, max_age)
+                except Exception:
+                    logger.exception('Prefetch of %s failed', symbol)
+                    continue
+                with self._lock:
+                    self._warmed[symbol] = time.monotonic()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            for symbol in self.most_viewed():
+                self.submit(symbol, REFRESH_PRIORITY, max_age=self.refresh_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {'queued': len(self._pending), 'viewed': len(self.views), 'warmed': len(self._warmed)}
+
+
+# Does nothing, when the prefetch is disabled (PREFETCH_ENABLED=0)
+class _DisabledScheduler:
+    def warm_symbols(self, symbols):
+        pass
+
+    def record_view(self, symbol):
+        pass
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+# Scheduler of this process, started on first use so every forked worker gets its own threads
+def get_scheduler():
+    global _scheduler, _scheduler_pid
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler_pid != os.getpid():
+            _scheduler = PrefetchScheduler().start() if PREFETCH_ENABLED else _DisabledScheduler()
+            _scheduler_pid = os.getpid()
+        return _scheduler
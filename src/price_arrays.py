@@ -0,0 +1,141 @@
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from shared_files import atomic_write, evict_lru, touch
+
+# Daily bars are kept per symbol as columns: int64 epoch days + float64 OHLCV
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Hot tier file: the float64 fetch time, then the n epoch days and the n values of every price column,
+# each column contiguous
+HEADER_BYTES = 8
+ROW_BYTES = 8 * (1 + len(PRICE_COLUMNS))
+FILE_SUFFIX = '.bars'
+
+
+def epoch_day(day):
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+
+# Daily bars of a symbol as arrays (views of a mapped hot tier file, or plain arrays)
+class PriceArrays:
+    def __init__(self, days, columns, fetched_at=0.0):
+        self.days = days
+        self.columns = columns
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_dict(cls, arrays):
+        return cls(arrays['Date'], {col: arrays[col] for col in PRICE_COLUMNS}, float(arrays.get('fetched_at', 0.0)))
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, col):
+        return self.columns[col]
+
+    # 'last day/number of bars', changes whenever new bars were added
+    @property
+    def version(self):
+        if len(self.days) == 0:
+            return ''
+        return f'{np.datetime64(int(self.days[-1]), "D")}/{len(self.days)}'
+
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    # Bars between the two days (datetime.date or 'YYYY-MM-DD', inclusive, None for no bound),
+    # found by binary search on the days; the result shares the arrays
+    def between(self, start=None, end=None):
+        first = 0 if start is None else int(np.searchsorted(self.days, epoch_day(start), side='left'))
+        last = len(self.days) if end is None else int(np.searchsorted(self.days, epoch_day(end), side='right'))
+        return PriceArrays(self.days[first:last], {col: values[first:last] for col, values in self.columns.items()},
+                           self.fetched_at)
+
+    # Copy as a frame: 'Date' (datetime64) + OHLCV columns, or OHLCV with a DatetimeIndex 'Date'
+    def frame(self, index=False):
+        dates = pd.DatetimeIndex(self.dates(), name='Date')
+        columns = {col: np.array(self.columns[col]) for col in PRICE_COLUMNS}
+        if index:
+            return pd.DataFrame(columns, index=dates)
+        return pd.DataFrame({'Date': dates, **columns})
+
+
+# Recently used histories as flat files in a folder shared by the workers of the host; every worker maps them
+# read only, so they share one copy of the pages (the page cache, or memory when the folder is in /dev/shm).
+# Files are replaced atomically, a worker maps the new file when the inode of the path changed.
+class HotTier:
+    def __init__(self, directory, max_bytes, max_maps=256):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_maps = max_maps
+        # Symbol -> (inode, arrays) of this worker
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, symbol):
+        return os.path.join(self.directory, quote(symbol, safe='') + FILE_SUFFIX)
+
+    def _map(self, path):
+        with open(path, 'rb') as hot_file:
+            size = os.fstat(hot_file.fileno()).st_size
+            if size < HEADER_BYTES:
+                return None
+            buffer = mmap.mmap(hot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        n = (size - HEADER_BYTES) // ROW_BYTES
+        fetched_at = float(np.frombuffer(buffer, np.float64, 1, 0)[0])
+        days = np.frombuffer(buffer, np.int64, n, HEADER_BYTES)
+        columns = {col: np.frombuffer(buffer, np.float64, n, HEADER_BYTES + 8 * n * (number + 1))
+                   for number, col in enumerate(PRICE_COLUMNS)}
+        return PriceArrays(days, columns, fetched_at)
+
+    # Mapped arrays of the symbol, None when it is not in the tier; mark_used=False leaves its eviction rank
+    def get(self, symbol, mark_used=True):
+        path = self._path(symbol)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._maps.get(symbol)
+            if cached is not None and cached[0] == inode:
+                self._maps.move_to_end(symbol)
+                arrays = cached[1]
+            else:
+                arrays = None
+        if arrays is None:
+            try:
+                arrays = self._map(path)
+            except (FileNotFoundError, ValueError, OSError):
+                return None
+            if arrays is None:
+                return None
+            with self._lock:
+                self._maps[symbol] = (inode, arrays)
+                while len(self._maps) > self.max_maps:
+                    self._maps.popitem(last=False)
+        if mark_used:
+            touch(path)
+        return arrays
+
+    # Write the arrays ('Date', OHLCV and 'fetched_at' of the price store) to the tier and return them mapped;
+    # the plain arrays when the tier cannot be written
+    def put(self, symbol, arrays):
+        path = self._path(symbol)
+        data = [np.float64(arrays.get('fetched_at', time.time())).tobytes(),
+                np.ascontiguousarray(arrays['Date'], dtype=np.int64).tobytes()]
+        data += [np.ascontiguousarray(arrays[col], dtype=np.float64).tobytes() for col in PRICE_COLUMNS]
+        try:
+            atomic_write(path, b''.join(data))
+        except OSError:
+            return PriceArrays.from_dict(arrays)
+        # Workers keep their mapping of a dropped file until they map a newer one
+        evict_lru(self.directory, FILE_SUFFIX, max_bytes=self.max_bytes, keep_path=path)
+        mapped = self.get(symbol)
+        return PriceArrays.from_dict(arrays) if mapped is None else mapped
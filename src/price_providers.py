@@ -0,0 +1,237 @@
+import contextlib
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+from requests.adapters import HTTPAdapter
+
+from config import HISTORY_PERIOD, HISTORY_YEARS, PRICE_PROVIDER, PRICE_PROVIDER_DIR, PRICE_PROVIDER_WORKERS, \
+    SYNTHETIC_SEED, UPSTREAM_BACKOFF, UPSTREAM_BUCKET_FILE, UPSTREAM_BURST, UPSTREAM_MAX_WAIT, UPSTREAM_RATE, \
+    UPSTREAM_RETRIES
+from metrics import observe
+from rate_limit import RateLimited, TokenBucket
+
+# Every provider returns daily bars with these columns and a DatetimeIndex named 'Date'
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Responses worth another try: throttled or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# The provider could not be reached (throttled, down ...), unlike a symbol without data
+class UpstreamError(Exception):
+    pass
+
+
+def _empty_bars():
+    return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=np.float64)
+
+
+# HTTP adapter of the provider sessions: every request, retries included, takes a token of the host's upstream
+# bucket, and throttled or failed requests are retried with exponential backoff (full jitter, or Retry-After)
+class ThrottledAdapter(HTTPAdapter):
+    def __init__(self, bucket, retries=UPSTREAM_RETRIES, backoff=UPSTREAM_BACKOFF, max_wait=UPSTREAM_MAX_WAIT,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.retries = retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        # Last failed request (an adapter serves one thread), yfinance swallows the exceptions of its requests
+        self.last_error = None
+
+    def _delay(self, attempt, response):
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            return min(float(retry_after), self.max_wait)
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_wait))
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                waited = self.bucket.acquire(self.max_wait)
+            except RateLimited as exc:
+                self.last_error = exc
+                raise
+            if waited:
+                observe('upstream.throttle', waited)
+            started = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt == self.retries:
+                    self.last_error = exc
+                    raise
+                response = None
+            finally:
+                observe('upstream.request', time.perf_counter() - started)
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt == self.retries):
+                if response.status_code in RETRY_STATUSES:
+                    self.last_error = UpstreamError(f'{request.url}: HTTP {response.status_code}')
+                return response
+            delay = self._delay(attempt, response)
+            if response is not None:
+                # Consume the discarded response so its connection goes back to the pool
+                with contextlib.suppress(requests.RequestException):
+                    response.content
+                response.close()
+            time.sleep(delay)
+
+
+# Daily bars from Yahoo Finance, many symbols at once over a pool of kept-alive HTTP connections
+class YFinanceProvider:
+    name = 'yfinance'
+
+    def __init__(self, workers=PRICE_PROVIDER_WORKERS):
+        self.workers = workers
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    # Threads of the bulk fetches, kept for the life of the process so their sessions (and kept-alive
+    # connections) serve every call; created after the fork of the worker
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='yfinance')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    # One session per thread (requests sessions are not thread safe), reused for every symbol it fetches
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.adapter = ThrottledAdapter(TokenBucket(UPSTREAM_BUCKET_FILE, UPSTREAM_RATE, UPSTREAM_BURST),
+                                                   pool_connections=4, pool_maxsize=4)
+            session.mount('https://', self._local.adapter)
+            self._local.session = session
+        return session
+
+    def _fetch_one(self, symbol, start):
+        ticker = yf.Ticker(symbol, session=self._session())
+        self._local.adapter.last_error = None
+        if start is None:
+            history = ticker.history(period=HISTORY_PERIOD)
+        else:
+            history = ticker.history(start=start)
+        if history.empty:
+            # yfinance returns no bars both for an unknown symbol and when its requests failed
+            error = self._local.adapter.last_error
+            if error is not None:
+                raise UpstreamError(f'{symbol}: {error}')
+            return _empty_bars()
+        return history[BAR_COLUMNS]
+
+    # Symbol -> bars from `start` (or the whole HISTORY_PERIOD), failed symbols are left out
+    def fetch_many(self, symbols, start=None):
+        symbols = list(dict.fromkeys(symbols))
+        if len(symbols) == 1:
+            try:
+                return {symbols[0]: self._fetch_one(symbols[0], start)}
+            except Exception:
+                return {}
+        results = {}
+        pool = self._pool()
+        futures = {symbol: pool.submit(self._fetch_one, symbol, start) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                results[symbol] = future.result()
+            except Exception:
+                continue
+        return results
+
+    def fetch(self, symbol, start=None):
+        return self._fetch_one(symbol, start)
+
+
+# Daily bars from a folder of <symbol>.csv or <symbol>.parquet files (Date, Open, High, Low, Close, Volume),
+# for running the app offline, in tests and benchmarks
+class LocalFileProvider:
+    name = 'local'
+
+    def __init__(self, directory=PRICE_PROVIDER_DIR):
+        self.directory = directory
+
+    def fetch(self, symbol, start=None):
+        path = os.path.join(self.directory, quote(symbol, safe=''))
+        if os.path.exists(path + '.parquet'):
+            # Read with pyarrow (requirements.txt)
+            history = pd.read_parquet(path + '.parquet')
+        elif os.path.exists(path + '.csv'):
+            history = pd.read_csv(path + '.csv')
+        else:
+            raise FileNotFoundError(f'No price file for {symbol} in {self.directory}')
+        if 'Date' in history.columns:
+            history = history.set_index('Date')
+        history.index = pd.DatetimeIndex(pd.to_datetime(history.index), name='Date')
+        history = history.sort_index()[BAR_COLUMNS]
+        if start is not None:
+            history = history[history.index >= pd.Timestamp(start)]
+        return history
+
+    def fetch_many(self, symbols, start=None):
+        results = {}
+        for symbol in dict.fromkeys(symbols):
+            try:
+                results[symbol] = self.fetch(symbol, start)
+            except FileNotFoundError:
+                continue
+        return results
+
+
+# Random-walk daily bars for any symbol, the same symbol always gets the same history
+class SyntheticProvider:
+    name = 'synthetic'
+
+    def __init__(self, years=HISTORY_YEARS, seed=SYNTHETIC_SEED):
+        self.years = years
+        self.seed = seed
+
+    def _history(self, symbol):
+        today = pd.Timestamp.today().normalize()
+        dates = pd.bdate_range(today - pd.DateOffset(years=self.years), today, name='Date')
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        start_price = rng.uniform(10, 500)
+        returns = rng.normal(0.0003, 0.02, len(dates))
+        close = start_price * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[start_price], close[:-1]]) * np.exp(rng.normal(0, 0.005, len(dates)))
+        spread = np.abs(rng.normal(0, 0.01, len(dates)))
+        return pd.DataFrame({'Open': open_,
+                             'High': np.maximum(open_, close) * (1 + spread),
+                             'Low': np.minimum(open_, close) * (1 - spread),
+                             'Close': close,
+                             'Volume': rng.integers(10 ** 5, 10 ** 7, len(dates)).astype(np.float64)},
+                            index=dates)
+
+    def fetch(self, symbol, start=None):
+        history = self._history(symbol)
+        if start is not None:
+            history = history[history.index >= pd.Timestamp(start)]
+        return history
+
+    def fetch_many(self, symbols, start=None):
+        return {symbol: self.fetch(symbol, start) for symbol in dict.fromkeys(symbols)}
+
+
+PROVIDERS = {provider.name: provider for provider in [YFinanceProvider, LocalFileProvider, SyntheticProvider]}
+
+_provider = None
+
+
+# Provider selected with PRICE_PROVIDER (yfinance, local or synthetic)
+def get_provider():
+    global _provider
+    if _provider is None:
+        if PRICE_PROVIDER not in PROVIDERS:
+            raise ValueError(f'Unknown PRICE_PROVIDER {PRICE_PROVIDER!r}, expected one of {sorted(PROVIDERS)}')
+        _provider = PROVIDERS[PRICE_PROVIDER]()
+    return _provider
@@ -0,0 +1,319 @@
+import contextlib
+import fcntl
+import io
+import os
+import time
+import zlib
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from config import HISTORY_YEARS, HOT_TIER_DIR, HOT_TIER_MAX_BYTES, PRICE_LOCK_DIR, PRICE_LOCK_SLOTS, \
+    PRICE_LOCK_WAIT, PRICE_STORE_DIR, PRICE_STORE_MAX_AGE, PRICE_STORE_MAX_BYTES, UPSTREAM_FAILURE_TTL
+from metrics import span
+from price_arrays import PRICE_COLUMNS, HotTier, PriceArrays
+from price_providers import UpstreamError, get_provider
+from shared_files import atomic_write, evict_lru, touch
+
+FILE_SUFFIX = '.npz'
+# Marker of a failed fetch next to the store file, its mtime is the time of the failure
+FAILURE_SUFFIX = '.failed'
+# Seconds between two tries of a symbol lock held by another request
+LOCK_POLL_SECONDS = 0.05
+# Calendar days of stored bars requested again by an incremental refresh, to check they did not change upstream
+REFETCH_OVERLAP_DAYS = 7
+# Relative change of a stored close that means the provider adjusted the history (split, dividend)
+ADJUSTMENT_TOLERANCE = 1e-4
+
+# Mapped copies of the recently used symbols, what the requests read
+hot_tier = HotTier(HOT_TIER_DIR, HOT_TIER_MAX_BYTES)
+
+
+def _symbol_path(symbol):
+    # Symbols can hold '/', '^', '=' ... so quote them to get a safe file name
+    return os.path.join(PRICE_STORE_DIR, quote(symbol, safe='') + FILE_SUFFIX)
+
+
+def _flock(lock_file, timeout):
+    if timeout is None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return True
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+
+
+@contextlib.contextmanager
+def _symbol_lock(symbol, timeout=None):
+    # Exclusive lock per symbol, shared by all the gunicorn workers of the host and their threads: the holder
+    # fetches the symbol, the others wait for it and read its result (single flight).
+    # Yields False when it was not acquired within timeout seconds.
+    # The symbols share PRICE_LOCK_SLOTS lock files (crc32, the same slot in every worker), so they do not pile up
+    os.makedirs(PRICE_LOCK_DIR, exist_ok=True)
+    slot = zlib.crc32(symbol.encode()) % PRICE_LOCK_SLOTS
+    with open(os.path.join(PRICE_LOCK_DIR, f'{slot}.lock'), 'a') as lock_file:
+        acquired = _flock(lock_file, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _failure_expired(path, mtime):
+    if time.time() - mtime < UPSTREAM_FAILURE_TTL:
+        return False
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+    return True
+
+
+def _failed_recently(symbol):
+    path = _symbol_path(symbol) + FAILURE_SUFFIX
+    try:
+        return not _failure_expired(path, os.stat(path).st_mtime)
+    except FileNotFoundError:
+        return False
+
+
+def _mark_failed(symbol, failed=True):
+    path = _symbol_path(symbol) + FAILURE_SUFFIX
+    if failed:
+        os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+        with open(path, 'a'):
+            os.utime(path)
+    else:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _read(path):
+    try:
+        with np.load(path) as stored:
+            return {key: stored[key] for key in stored.files}
+    except (FileNotFoundError, ValueError, OSError):
+        # Missing, evicted by another worker or unreadable -> fetch it again
+        return None
+
+
+def _write(path, arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    atomic_write(path, buffer.getvalue(), fsync=True)
+
+
+def _is_fresh(arrays, max_age):
+    return arrays is not None and time.time() - float(arrays['fetched_at']) < max_age
+
+
+def _frame_to_arrays(history):
+    # yfinance returns exchange-local timestamps, keep only the trading day
+    index = pd.DatetimeIndex(history.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    arrays = {'Date': index.normalize().values.astype('datetime64[D]').astype(np.int64)}
+    for col in PRICE_COLUMNS:
+        arrays[col] = history[col].to_numpy(dtype=np.float64)
+    return arrays
+
+
+def _fetch(symbol, start=None):
+    with span('upstream'):
+        history = get_provider().fetch(symbol, start=start)
+    return _frame_to_arrays(history.dropna(subset=['Close']))
+
+
+def _merge(old, new):
+    # New bars replace the old ones from their first day on (the last stored bar may have been intraday)
+    if old is None or len(old['Date']) == 0:
+        merged = new
+    elif len(new['Date']) == 0:
+        merged = old
+    else:
+        keep = old['Date'] < new['Date'][0]
+        merged = {col: np.concatenate([old[col][keep], new[col]]) for col in ['Date'] + PRICE_COLUMNS}
+    # Keep only the history window that the app shows
+    first_day = (pd.Timestamp.today().normalize() - pd.DateOffset(years=HISTORY_YEARS)).to_datetime64()
+    keep = merged['Date'] >= first_day.astype('datetime64[D]').astype(np.int64)
+    return {col: merged[col][keep] for col in ['Date'] + PRICE_COLUMNS}
+
+
+def _last_day(stored):
+    if stored is None or len(stored['Date']) == 0:
+        return None
+    return str(np.datetime64(int(stored['Date'][-1]), 'D'))
+
+
+# First day of an incremental refresh: the last stored day, less the overlap that is checked by _was_adjusted
+def _refetch_start(stored):
+    return str(np.datetime64(int(stored['Date'][-1]), 'D') - np.timedelta64(REFETCH_OVERLAP_DAYS, 'D'))
+
+
+# Whether the closes of the completed stored bars (not the last one, it may have been intraday) changed in
+# the new bars: the provider back-adjusts the whole history for splits and dividends (yfinance auto_adjust),
+# so the new bars cannot be spliced onto the stored ones
+def _was_adjusted(old, new):
+    _, old_at, new_at = np.intersect1d(old['Date'][:-1], new['Date'], return_indices=True)
+    return not np.allclose(new['Close'][new_at], old['Close'][old_at], rtol=ADJUSTMENT_TOLERANCE, atol=0)
+
+
+def _refresh(symbol, path, stored, new=None):
+    if new is None:
+        if _failed_recently(symbol):
+            # Failed for another request a moment ago, upstream is not asked again before UPSTREAM_FAILURE_TTL
+            if stored is None:
+                raise UpstreamError(f'{symbol}: fetch failed less than {UPSTREAM_FAILURE_TTL:g}s ago')
+            return stored
+        try:
+            # Only the bars from the last stored days on are requested
+            new = _fetch(symbol, start=None if _last_day(stored) is None else _refetch_start(stored))
+        except Exception:
+            _mark_failed(symbol)
+            if stored is None:
+                raise
+            # Upstream is down or throttling: a stale history is better than no history
+            return stored
+    if stored is not None and _last_day(stored) is not None and _was_adjusted(stored, new):
+        # Adjusted since it was stored: the whole history is replaced
+        try:
+            new, stored = _fetch(symbol), None
+        except Exception:
+            _mark_failed(symbol)
+            return stored
+    arrays = _merge(stored, new)
+    arrays['fetched_at'] = np.array(time.time())
+    _write(path, arrays)
+    hot_tier.put(symbol, arrays)
+    _mark_failed(symbol, failed=False)
+    return arrays
+
+
+# Drop the least recently used symbols while the store is above its size cap, and the expired failure markers
+# of the symbols not requested since
+def _evict(keep_path):
+    evict_lru(PRICE_STORE_DIR, FILE_SUFFIX, max_bytes=PRICE_STORE_MAX_BYTES, keep_path=keep_path)
+    with contextlib.suppress(FileNotFoundError), os.scandir(PRICE_STORE_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(FAILURE_SUFFIX):
+                with contextlib.suppress(FileNotFoundError):
+                    _failure_expired(entry.path, entry.stat().st_mtime)
+
+
+# Stored arrays of the symbol, the newest bars are fetched when they are older than max_age seconds
+def _stored_arrays(symbol, max_age):
+    path = _symbol_path(symbol)
+    stored = _read(path)
+    if not _is_fresh(stored, max_age):
+        # With stale bars to show, another request's fetch is only waited for PRICE_LOCK_WAIT seconds
+        with _symbol_lock(symbol, timeout=None if stored is None else PRICE_LOCK_WAIT) as acquired:
+            if acquired:
+                # Another worker may have refreshed it while we were waiting for the lock
+                stored = _read(path)
+                if not _is_fresh(stored, max_age):
+                    stored = _refresh(symbol, path, stored)
+        _evict(path)
+    else:
+        touch(path)
+    return stored
+
+
+# Daily bars of the symbol as arrays mapped from the hot tier (shared by the workers, no copy),
+# the newest bars are fetched when the stored ones are older than max_age seconds
+def get_arrays(symbol, max_age=PRICE_STORE_MAX_AGE):
+    hot = hot_tier.get(symbol)
+    if hot is not None and time.time() - hot.fetched_at < max_age:
+        return hot
+    stored = _stored_arrays(symbol, max_age)
+    hot = hot_tier.get(symbol)
+    if hot is None or hot.fetched_at != float(stored['fetched_at']):
+        # Evicted from the hot tier, or stored before it existed
+        hot = hot_tier.put(symbol, stored)
+    return hot
+
+
+# Daily bars of the symbol as a frame with a DatetimeIndex, see get_arrays
+def get_history(symbol, max_age=PRICE_STORE_MAX_AGE):
+    return get_arrays(symbol, max_age).frame(index=True)
+
+
+# Stored daily bars of the symbol without any upstream request, None when it is not in the store
+def get_stored_history(symbol):
+    hot = hot_tier.get(symbol)
+    if hot is not None:
+        return hot.frame(index=True)
+    stored = _read(_symbol_path(symbol))
+    return None if stored is None else PriceArrays.from_dict(stored).frame(index=True)
+
+
+# Versions of the store files read by this worker: symbol -> ((inode, size), version), a write replaces the file
+_file_versions = {}
+
+
+# Version of the stored history ('last day/number of bars', as PriceArrays.version) without reading the bars:
+# from the hot tier, else from the dates of the store file, cached until the file is replaced;
+# None when the symbol is not in the store
+def stored_version(symbol):
+    hot = hot_tier.get(symbol, mark_used=False)
+    if hot is not None:
+        return hot.version
+    path = _symbol_path(symbol)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    file_id = (stat.st_ino, stat.st_size)
+    cached = _file_versions.get(symbol)
+    if cached is not None and cached[0] == file_id:
+        return cached[1]
+    try:
+        with np.load(path) as stored:
+            days = stored['Date']
+    except (FileNotFoundError, ValueError, OSError, KeyError):
+        return None
+    version = f'{np.datetime64(int(days[-1]), "D")}/{len(days)}' if len(days) else ''
+    _file_versions[symbol] = (file_id, version)
+    return version
+
+
+# Bring the stale symbols up to date with bulk provider requests (one for the new symbols, one from the
+# oldest refresh start for the others, see _refetch_start); symbols the provider misses are fetched one by one
+# by get_history. A symbol is only locked for its own merge, so a request for it never waits for the whole
+# batch; one refreshed by another request meanwhile is left as it is
+def refresh_many(symbols, max_age=PRICE_STORE_MAX_AGE):
+    stale = {}
+    for symbol in dict.fromkeys(symbols):
+        stored = _read(_symbol_path(symbol))
+        if not _is_fresh(stored, max_age) and not _failed_recently(symbol):
+            stale[symbol] = stored
+    if not stale:
+        return []
+    new_symbols = [symbol for symbol, stored in stale.items() if _last_day(stored) is None]
+    old_symbols = [symbol for symbol in stale if symbol not in new_symbols]
+    fetched = {}
+    with span('upstream.bulk'):
+        if new_symbols:
+            fetched.update(get_provider().fetch_many(new_symbols))
+        if old_symbols:
+            start = min(_refetch_start(stale[symbol]) for symbol in old_symbols)
+            fetched.update(get_provider().fetch_many(old_symbols, start=start))
+
+    refreshed = []
+    for symbol, history in fetched.items():
+        path = _symbol_path(symbol)
+        with _symbol_lock(symbol, timeout=PRICE_LOCK_WAIT) as acquired:
+            if not acquired:
+                continue
+            stored = _read(path)
+            if _is_fresh(stored, max_age):
+                continue
+            _refresh(symbol, path, stored, _frame_to_arrays(history.dropna(subset=['Close'])))
+            refreshed.append(symbol)
+    _evict(None)
+    return refreshed
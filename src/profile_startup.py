@@ -0,0 +1,58 @@
+# Import-time profile of a worker cold start: python profile_startup.py [--budget 3.0] [--top 20]
+# Imports app in a fresh interpreter with the network disabled, so any upstream call at import fails the check.
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from config import BASE_DIR
+
+NO_NETWORK_IMPORT = """
+import socket
+def _no_network(*args, **kwargs):
+    raise RuntimeError('network call at import time')
+socket.socket.connect = _no_network
+socket.create_connection = _no_network
+import app
+"""
+
+
+def profile_import():
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', NO_NETWORK_IMPORT],
+                            cwd=BASE_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return result, elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time profile of the app cold start')
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('STARTUP_BUDGET_SECONDS', 3.0)),
+                        help='Cold start budget in seconds')
+    parser.add_argument('--top', type=int, default=20, help='Number of modules in the report')
+    args = parser.parse_args()
+
+    result, elapsed, modules = profile_import()
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else 'import app failed')
+        sys.exit(1)
+
+    print(f'{"cumulative [ms]":>16} {"self [ms]":>10}  module')
+    for cumulative_us, self_us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f'{cumulative_us / 1000:16.1f} {self_us / 1000:10.1f}  {name}')
+    print(f'\nCold start (interpreter + import app): {elapsed:.2f}s, budget {args.budget:.2f}s')
+    if elapsed > args.budget:
+        print('Over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
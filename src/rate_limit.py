@@ -0,0 +1,56 @@
+import fcntl
+import os
+import struct
+import time
+
+from shared_files import atomic_write
+
+# State of a bucket file: tokens left and time of the last update
+STATE_FORMAT = 'dd'
+
+
+class RateLimited(Exception):
+    pass
+
+
+# Token bucket shared by every process of the host through a small state file, read and replaced under an
+# fcntl lock of the file next to it: `rate` tokens per second are added up to `burst`, every request takes one
+class TokenBucket:
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+
+    # Take a token, or return the seconds until one is available
+    def _take(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                with open(self.path, 'rb') as state_file:
+                    state = state_file.read()
+            except FileNotFoundError:
+                state = b''
+            if len(state) == struct.calcsize(STATE_FORMAT):
+                tokens, updated = struct.unpack(STATE_FORMAT, state)
+                tokens = min(self.burst, tokens + max(now - updated, 0.0) * self.rate)
+            else:
+                tokens = self.burst
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if wait == 0.0:
+                tokens -= 1
+            atomic_write(self.path, struct.pack(STATE_FORMAT, tokens, now))
+            # The lock goes with the closed file
+            return wait
+
+    # Wait for a token, RateLimited when none is available within max_wait seconds; returns the seconds waited
+    def acquire(self, max_wait):
+        started = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait == 0.0:
+                return time.monotonic() - started
+            if time.monotonic() - started + wait > max_wait:
+                raise RateLimited(f'No upstream request token within {max_wait:g}s')
+            time.sleep(wait)
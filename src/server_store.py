@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from config import COMPARE_TIMEOUT, COMPARE_WORKERS, PRICE_STORE_MAX_AGE
+from memo_cache import payload_cache
+from metrics import span, timed
+from price_store import get_arrays
+
+
+# Price arrays of the symbol (int64 epoch days + float64 OHLCV), mapped from the hot tier that the workers share
+def get_symbol_arrays(selected_symbol, max_age=PRICE_STORE_MAX_AGE):
+    with span('price_store'):
+        return get_arrays(selected_symbol, max_age=max_age)
+
+
+# History of the symbol between the two dates (inclusive), found by binary search on the days
+def get_history_range(selected_symbol, start_date, end_date):
+    return get_symbol_arrays(selected_symbol).between(start_date, end_date)
+
+
+# Compact columnar history of the symbol shipped once to the browser, which slices and draws it (assets/charts.js)
+@timed('payload')
+def history_payload(selected_symbol, arrays):
+    payload = {'symbol': selected_symbol, 'version': arrays.version,
+               'date': np.datetime_as_string(arrays.dates()).tolist()}
+    for col in ['Open', 'High', 'Low', 'Close']:
+        payload[col.lower()] = np.round(arrays[col], 4).tolist()
+    return payload
+
+
+# Key (symbol + data version) and browser payload of the symbol history,
+# the payload is shared by the workers through payload_cache
+def symbol_history_data(selected_symbol, arrays=None):
+    if arrays is None:
+        arrays = get_symbol_arrays(selected_symbol)
+    history_key = {'symbol': selected_symbol, 'version': arrays.version}
+    payload = payload_cache.get_or_compute([history_key['symbol'], history_key['version']],
+                                           lambda: history_payload(selected_symbol, arrays))
+    return history_key, payload
+
+
+_loader = None
+_loader_pid = None
+_loader_lock = threading.Lock()
+
+
+# Thread pool of this process for the concurrent history loads, created after the fork of the worker
+def _history_loader():
+    global _loader, _loader_pid
+    with _loader_lock:
+        if _loader is None or _loader_pid != os.getpid():
+            _loader = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix='history-loader')
+            _loader_pid = os.getpid()
+        return _loader
+
+
+# Histories of several symbols loaded concurrently, so the wait is about the slowest one and not their sum;
+# symbols that fail, have no history or are not loaded within timeout seconds are returned apart
+def load_symbol_histories(symbols, timeout=COMPARE_TIMEOUT):
+    loader = _history_loader()
+    futures = {symbol: loader.submit(get_symbol_arrays, symbol) for symbol in symbols}
+    done, _ = wait(futures.values(), timeout=timeout)
+    histories, failed = {}, []
+    for symbol, future in futures.items():
+        if future in done and future.exception() is None and len(future.result()):
+            histories[symbol] = future.result()
+        else:
+            # Still queued: drop it (a running load finishes in the background and fills the caches)
+            future.cancel()
+            failed.append(symbol)
+    return histories, failed
@@ -0,0 +1,55 @@
+import contextlib
+import os
+import tempfile
+
+
+# Write the bytes to path through a temp file in the same folder and a rename, so the workers reading it never
+# see a partial file (one that opened the old file keeps reading it); fsync=True also flushes it to the disk
+def atomic_write(path, data, fsync=False):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+            if fsync:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+# Mark the file as recently used, evict_lru drops the files by mtime
+def touch(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.utime(path)
+
+
+# Drop the least recently used files ending with suffix while the folder holds more than max_entries of them
+# or more than max_bytes (None for no cap); keep_path is never dropped
+def evict_lru(directory, suffix, max_entries=None, max_bytes=None, keep_path=None):
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(suffix)]
+    except FileNotFoundError:
+        return
+    if (max_entries is None or len(entries) <= max_entries) and max_bytes is None:
+        return
+    files = []
+    for entry in entries:
+        with contextlib.suppress(FileNotFoundError):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    count = len(files)
+    total_size = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if (max_entries is None or count <= max_entries) and (max_bytes is None or total_size <= max_bytes):
+            break
+        if path == keep_path:
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        count -= 1
+        total_size -= size
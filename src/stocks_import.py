@@ -1,48 +1,150 @@
+import argparse
+import contextlib
+import math
+import pickle
+from importlib.metadata import version
+
 import pandas as pd
 from pytickersymbols import PyTickerSymbols
 
-stock_data = PyTickerSymbols()
+from config import CATALOG_SNAPSHOT
+from shared_files import atomic_write
 
+# indexes, df_symbols and df_industries are loaded from the snapshot on first use (see __getattr__)
+CATALOG_NAMES = ('indexes', 'df_symbols', 'df_industries')
+# Layout of the snapshot, older snapshots are rebuilt
+CATALOG_FORMAT = 2
+_catalog = None
 
 
-indexes = stock_data.get_all_indices()
-#indexes = ['DOW JONES', 'S&P 100', 'S&P 500', 'DAX', 'NASDAQ 100']
-indexes.sort()
+def build_catalog():
+    stock_data = PyTickerSymbols()
 
-# Initialize an empty DataFrame
-df = pd.DataFrame()
+    indexes = stock_data.get_all_indices()
+    #indexes = ['DOW JONES', 'S&P 100', 'S&P 500', 'DAX', 'NASDAQ 100']
+    indexes.sort()
 
-# Iterate over the indexes and append the data to df
-for i in indexes:
-    df_temp = pd.DataFrame(stock_data.get_stocks_by_index(i))
-    df_temp['index'] = i
-    df = pd.concat([df, df_temp], ignore_index=True)
+    # Collect the stocks of every index and concat them once
+    frames = []
+    for i in indexes:
+        df_temp = pd.DataFrame(stock_data.get_stocks_by_index(i))
+        df_temp['index'] = i
+        frames.append(df_temp)
+    df = pd.concat(frames, ignore_index=True)
     df['symbol'] = df['symbol'].fillna('NAN')
-main_df = df[['symbol', 'name', 'country', 'index', 'industries', 'metadata']]
-main_df = main_df.join(pd.DataFrame(main_df['metadata'].tolist()))
-main_df = main_df.drop(columns=['metadata'])
+    main_df = df[['symbol', 'name', 'country', 'index', 'industries', 'metadata']]
+    main_df = main_df.join(pd.DataFrame(main_df['metadata'].tolist()))
+    main_df = main_df.drop(columns=['metadata'])
+
+
+    df_symbols = main_df[['symbol', 'name', 'country', 'index', 'founded', 'employees']]
+
+    # Numbers (NaN when unknown), formatted only for display (format_employees)
+    df_symbols = df_symbols.assign(employees=pd.to_numeric(df_symbols['employees'], errors='coerce'))
+
+
+    df_symbols = df_symbols.rename(columns={
+                                            'symbol': 'Symbol',
+                                            'name': 'Company Name',
+                                            'country': 'Country',
+                                            'index': 'Stock Index',
+                                            'founded': 'Year of Founded',
+                                            'employees': '#Employees'})
+
+
+    df_industries = main_df.explode('industries')[['industries', 'symbol']]
+    df_industries['industries'] = df_industries['industries'].fillna('Unknown')
+    df_industries = df_industries.drop_duplicates().sort_values(by=['industries']).reset_index(drop=True)
+    df_industries = df_industries.rename(columns={
+                                                  'industries': 'Industries',
+                                                  'symbol': 'Symbol',
+                                                  'name': 'Company Name'})
+
+    # Dictionary-encoded strings; both tables share the symbol categories, so a symbol is stored once
+    # and its category code is its ID in both
+    symbol_dtype = pd.CategoricalDtype(sorted(set(df_symbols['Symbol']) | set(df_industries['Symbol'])))
+    df_symbols = df_symbols.astype({'Symbol': symbol_dtype, 'Company Name': 'category', 'Country': 'category',
+                                    'Stock Index': 'category'})
+    df_industries = df_industries.astype({'Industries': 'category', 'Symbol': symbol_dtype})
+
+    return {'indexes': indexes, 'df_symbols': df_symbols, 'df_industries': df_industries}
+
+
+# '12,345' for the tables, 'N/A' when unknown
+def format_employees(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'N/A'
+    return f'{value:,.0f}'
+
+
+# The snapshot is rebuilt when pytickersymbols is upgraded
+def _source_version():
+    return version('pytickersymbols')
+
+
+# Version of the catalog data (source package and snapshot layout)
+def catalog_version():
+    return f'{_source_version()}/{CATALOG_FORMAT}'
+
+
+def save_catalog(catalog, path=CATALOG_SNAPSHOT):
+    atomic_write(path, pickle.dumps({'version': _source_version(), 'format': CATALOG_FORMAT, **catalog},
+                                    protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_catalog(path=CATALOG_SNAPSHOT):
+    try:
+        with open(path, 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+        if snapshot.get('version') == _source_version() and snapshot.get('format') == CATALOG_FORMAT:
+            return {name: snapshot[name] for name in CATALOG_NAMES}
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+        pass
+    # No (valid) snapshot yet: build the catalog and keep it for the next workers
+    catalog = build_catalog()
+    with contextlib.suppress(OSError):
+        save_catalog(catalog, path)
+    return catalog
+
 
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+    return _catalog
 
-df_symbols = main_df[['symbol', 'name', 'country', 'index', 'founded', 'employees']]
 
-df_symbols = df_symbols.assign(employees=pd.to_numeric(df_symbols['employees'], errors='coerce'))
-df_symbols = df_symbols.assign(employees=df_symbols['employees'].map('{:,.0f}'.format))
-df_symbols['employees'] = df_symbols['employees'].replace('nan', 'N/A')
+def __getattr__(name):
+    if name in CATALOG_NAMES:
+        return get_catalog()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-df_symbols = df_symbols.rename(columns={
-                                        'symbol': 'Symbol',
-                                        'name': 'Company Name',
-                                        'country': 'Country',
-                                        'index': 'Stock Index',
-                                        'founded': 'Year of Founded',
-                                        'employees': '#Employees'})
+# Bytes of the catalog frames, against the object-dtype frames with pre-formatted employees they replaced
+def memory_report(catalog):
+    legacy = {'df_symbols': catalog['df_symbols'].astype(object).assign(
+                  **{'#Employees': catalog['df_symbols']['#Employees'].map(format_employees)}),
+              'df_industries': catalog['df_industries'].astype(object)}
+    lines = [f'{"":16}{"compact":>12}{"object":>12}']
+    totals = [0, 0]
+    for name in ['df_symbols', 'df_industries']:
+        compact = int(catalog[name].memory_usage(deep=True).sum())
+        old = int(legacy[name].memory_usage(deep=True).sum())
+        totals = [totals[0] + compact, totals[1] + old]
+        lines.append(f'{name:16}{compact:12,}{old:12,}')
+    lines.append(f'{"per worker":16}{totals[0]:12,}{totals[1]:12,}')
+    lines.append('(with gunicorn --preload the workers share one copy, copy-on-write)')
+    return '\n'.join(lines)
 
 
-df_industries = main_df.explode('industries')[['industries', 'symbol']]
-df_industries['industries'] = df_industries['industries'].fillna('Unknown')
-df_industries = df_industries.drop_duplicates().sort_values(by=['industries']).reset_index(drop=True)
-df_industries = df_industries.rename(columns={
-                                              'industries': 'Industries',
-                                              'symbol': 'Symbol',
-                                              'name': 'Company Name'})
+# Build step (deploy): python stocks_import.py [snapshot path] [--report]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the symbol catalog snapshot')
+    parser.add_argument('snapshot_path', nargs='?', default=CATALOG_SNAPSHOT)
+    parser.add_argument('--report', action='store_true', help='Print the memory used by the catalog')
+    args = parser.parse_args()
+    catalog = build_catalog()
+    save_catalog(catalog, args.snapshot_path)
+    print(f'Catalog snapshot written to {args.snapshot_path}')
+    if args.report:
+        print(memory_report(catalog))
@@ -0,0 +1,184 @@
+import json
+import os
+from collections import deque
+from urllib.parse import quote
+
+import numpy as np
+
+from analysis_func import MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD, BB_TIMEPERIOD, BB_NBDEVUP, \
+    BB_NBDEVDN, RSI_TIMEPERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD, MACD_NAME, BB_NAME, RSI_NAME
+from config import INDICATOR_STATE_DIR
+from price_store import ADJUSTMENT_TOLERANCE
+from shared_files import atomic_write
+
+
+# One step of pandas ewm(span, adjust=False), so the incremental values match compute_indicators
+def _ema_step(previous, value, span):
+    if previous is None:
+        return value
+    alpha = 2 / (span + 1)
+    return ((1 - alpha) * previous + alpha * value) / ((1 - alpha) + alpha)
+
+
+# MACD, Bollinger Bands and RSI state of one symbol, updated in O(1) with every new daily bar
+class IncrementalIndicators:
+    def __init__(self):
+        self.last_day = None
+        self.last_close = None
+        # Close and EMAs before the last bar, to update the last bar again while it is still intraday
+        self.prev_close = None
+        self.prev_emas = [None, None, None]
+        # Fast, slow and signal EMAs after the last bar
+        self.emas = [None, None, None]
+        self.bb_window = deque(maxlen=BB_TIMEPERIOD)
+        self.up_window = deque(maxlen=RSI_TIMEPERIOD)
+        self.down_window = deque(maxlen=RSI_TIMEPERIOD)
+
+    # Add the bar of a new day, or replace the last bar when it is the same day (days are epoch days)
+    def update(self, day, close):
+        day = int(day)
+        close = float(close)
+        if np.isnan(close) or (self.last_day is not None and day < self.last_day):
+            return
+        replace = day == self.last_day
+        if not replace:
+            self.prev_close = self.last_close
+            self.prev_emas = self.emas
+
+        fast = _ema_step(self.prev_emas[0], close, MACD_FAST_PERIOD)
+        slow = _ema_step(self.prev_emas[1], close, MACD_SLOW_PERIOD)
+        signal = _ema_step(self.prev_emas[2], fast - slow, MACD_SIGNAL_PERIOD)
+        self.emas = [fast, slow, signal]
+
+        # The first day has no movement
+        diff = close - self.prev_close if self.prev_close is not None else 0.0
+        movements = (close, max(diff, 0.0), max(-diff, 0.0))
+        for window, value in zip((self.bb_window, self.up_window, self.down_window), movements):
+            if replace:
+                window[-1] = value
+            else:
+                window.append(value)
+
+        self.last_day = day
+        self.last_close = close
+
+    def update_many(self, days, closes):
+        for day, close in zip(days, closes):
+            self.update(day, close)
+
+    # Latest value of every indicator (NaN until its window is full)
+    def values(self):
+        if self.last_day is None:
+            return {}
+        fast, slow, signal = self.emas
+        values = {'macd': fast - slow, 'macd_signal': signal, 'macd_hist': fast - slow - signal,
+                  'bb_middle': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'rsi': np.nan}
+        if len(self.bb_window) == BB_TIMEPERIOD:
+            window = np.array(self.bb_window)
+            rolling_mean = np.mean(window)
+            rolling_std = np.std(window, ddof=1)
+            values.update(bb_middle=rolling_mean,
+                          bb_upper=rolling_mean + BB_NBDEVUP * rolling_std,
+                          bb_lower=rolling_mean - BB_NBDEVDN * rolling_std)
+        if len(self.up_window) == RSI_TIMEPERIOD:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                relative_strength = np.float64(np.mean(self.up_window)) / np.float64(np.mean(self.down_window))
+                values['rsi'] = 100 - (100 / (1 + relative_strength))
+        return values
+
+    # Latest Buy/Sell/Hold of every analysis, same rules as analysis_func.latest_signals; {} without any bar
+    def signals(self):
+        values = self.values()
+        if not values:
+            return {}
+        if values['bb_upper'] < self.last_close:
+            bb_signal = "Sell"
+        elif values['bb_lower'] > self.last_close:
+            bb_signal = "Buy"
+        else:
+            bb_signal = "Hold"
+        if values['rsi'] > RSI_OVERBOUGHT:
+            rsi_signal = "Sell"
+        elif values['rsi'] < RSI_OVERSOLD:
+            rsi_signal = "Buy"
+        else:
+            rsi_signal = "Hold"
+        return {MACD_NAME: "Buy" if values['macd_hist'] > 0 else "Sell",
+                BB_NAME: bb_signal,
+                RSI_NAME: rsi_signal}
+
+    def to_dict(self):
+        return {'last_day': self.last_day, 'last_close': self.last_close,
+                'prev_close': self.prev_close, 'prev_emas': self.prev_emas, 'emas': self.emas,
+                'bb_window': list(self.bb_window), 'up_window': list(self.up_window),
+                'down_window': list(self.down_window)}
+
+    @classmethod
+    def from_dict(cls, state):
+        indicators = cls()
+        indicators.last_day = state['last_day']
+        indicators.last_close = state['last_close']
+        indicators.prev_close = state['prev_close']
+        indicators.prev_emas = state['prev_emas']
+        indicators.emas = state['emas']
+        indicators.bb_window.extend(state['bb_window'])
+        indicators.up_window.extend(state['up_window'])
+        indicators.down_window.extend(state['down_window'])
+        return indicators
+
+    # Build the state from a price history (DatetimeIndex 'Date' + 'Close' column, as price_store returns)
+    @classmethod
+    def from_history(cls, history):
+        indicators = cls()
+        indicators.update_many(_epoch_days(history), history['Close'].to_numpy())
+        return indicators
+
+
+def _epoch_days(history):
+    return history.index.values.astype('datetime64[D]').astype(np.int64)
+
+
+def _state_path(symbol):
+    return os.path.join(INDICATOR_STATE_DIR, quote(symbol, safe='') + '.json')
+
+
+def load_state(symbol):
+    try:
+        with open(_state_path(symbol)) as state_file:
+            return IncrementalIndicators.from_dict(json.load(state_file))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def save_state(symbol, indicators):
+    # Several workers may save the same symbol
+    atomic_write(_state_path(symbol), json.dumps(indicators.to_dict()).encode())
+
+
+# Whether the history still holds the bars the state was built from: its last day, and the close before it
+# unchanged (the last bar may have been intraday); the provider adjusts the whole history for splits and
+# dividends, the price store then replaces it (price_store._was_adjusted)
+def _state_matches(indicators, days, closes):
+    if indicators.last_day is None:
+        return False
+    at = int(np.searchsorted(days, indicators.last_day))
+    if at == len(days) or days[at] != indicators.last_day:
+        return False
+    if indicators.prev_close is None:
+        return True
+    return at > 0 and bool(np.isclose(closes[at - 1], indicators.prev_close, rtol=ADJUSTMENT_TOLERANCE, atol=0))
+
+
+# Bring the saved state of the symbol up to date with the history, only the bars from its last day on are applied;
+# rebuilt from the whole history when it does not match the state any more
+def update_symbol_state(symbol, history):
+    indicators = load_state(symbol)
+    days = _epoch_days(history)
+    closes = history['Close'].to_numpy()
+    if indicators is None or not _state_matches(indicators, days, closes):
+        indicators = IncrementalIndicators.from_history(history)
+    else:
+        new = days >= indicators.last_day
+        indicators.update_many(days[new], closes[new])
+    save_state(symbol, indicators)
+    return indicators
@@ -0,0 +1,96 @@
+import bisect
+import re
+from collections import Counter
+
+from config import SYMBOL_SEARCH_RESULTS
+
+# Shared trigrams (share of the query's) for a name to count as a typo match
+FUZZY_MIN_SHARE = 0.5
+_SEPARATORS = re.compile(r'[^0-9a-z]+')
+
+
+def _normalize(text):
+    return ' '.join(_SEPARATORS.sub(' ', str(text).lower()).split())
+
+
+# Trigrams of the text, padded: with the ones marking its start and end
+def _trigrams(text, padded=True):
+    if padded:
+        text = f' {text} '
+    return {text[start: start + 3] for start in range(len(text) - 2)}
+
+
+# Search of the catalog stocks by symbol or company name, for the search-as-you-type dropdowns.
+# Matches are ranked: symbol prefix, company name prefix, prefix of a word of the name, substring (trigram
+# index), then typos (most shared trigrams); the sorted prefix lists only walk as far as the results needed.
+class SymbolSearch:
+    def __init__(self, df_symbols):
+        # Stock id -> symbol, company name and their normalized text, one stock per (symbol, company name)
+        pairs = list(dict.fromkeys(zip(df_symbols['Symbol'].astype(str), df_symbols['Company Name'].astype(str))))
+        self.symbols = [symbol for symbol, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self._texts = [(_normalize(symbol), _normalize(name)) for symbol, name in pairs]
+        # Symbol -> its first stock, for the labels
+        self.ids = {}
+        for stock_id, symbol in enumerate(self.symbols):
+            self.ids.setdefault(symbol, stock_id)
+
+        # Sorted (key, stock id) lists of the prefix tiers, and trigram -> stock ids
+        symbol_keys, name_keys, word_keys = [], [], []
+        trigrams = {}
+        for stock_id, (symbol, name) in enumerate(self._texts):
+            symbol_keys.append((symbol, stock_id))
+            name_keys.append((name, stock_id))
+            word_keys.extend((word, stock_id) for word in name.split()[1:])
+            for trigram in _trigrams(symbol) | _trigrams(name):
+                trigrams.setdefault(trigram, set()).add(stock_id)
+        self._tiers = [sorted(symbol_keys), sorted(name_keys), sorted(word_keys)]
+        self._trigrams = trigrams
+
+    def _prefix_matches(self, keys, prefix):
+        for position in range(bisect.bisect_left(keys, (prefix,)), len(keys)):
+            key, stock_id = keys[position]
+            if not key.startswith(prefix):
+                return
+            yield stock_id
+
+    # Stocks containing the query: candidates from the trigram postings, then checked
+    def _substring_matches(self, query):
+        if len(query) < 3:
+            return []
+        postings = sorted((self._trigrams.get(trigram, set()) for trigram in _trigrams(query, padded=False)), key=len)
+        candidates = set.intersection(*postings)
+        return sorted((stock_id for stock_id in candidates if any(query in text for text in self._texts[stock_id])),
+                      key=self.symbols.__getitem__)
+
+    def _fuzzy_matches(self, query):
+        query_trigrams = _trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        least = FUZZY_MIN_SHARE * len(query_trigrams)
+        return [stock_id for stock_id, count in shared.most_common() if count >= least]
+
+    # Matches in rank order, a tier is only searched when the ones before did not give enough stocks
+    def _matches(self, query):
+        for keys in self._tiers:
+            yield from self._prefix_matches(keys, query)
+        yield from self._substring_matches(query)
+        yield from self._fuzzy_matches(query)
+
+    # (symbol, company name) of the best `limit` symbols for the query, with the name that matched
+    def search(self, query, limit=SYMBOL_SEARCH_RESULTS):
+        query = _normalize(query)
+        found = {}
+        if query:
+            for stock_id in self._matches(query):
+                found.setdefault(self.symbols[stock_id], self.names[stock_id])
+                if len(found) >= limit:
+                    break
+        return list(found.items())
+
+    # Option of the dropdowns: 'AZN - AstraZeneca PLC' (the first company name of the symbol by default)
+    def option(self, symbol, name=None):
+        if name is None and symbol in self.ids:
+            name = self.names[self.ids[symbol]]
+        return {'label': symbol if name is None else f'{symbol} - {name}', 'value': symbol}
@@ -0,0 +1,121 @@
+import math
+
+import pandas as pd
+
+from metrics import timed
+from stocks_import import format_employees
+
+# Columns compared and sorted as numbers
+NUMERIC_COLUMNS = ['Year of Founded', '#Employees', 'Last Close']
+# Columns kept as numbers in the frames but shown as text in the tables
+DISPLAY_FORMATS = {'#Employees': format_employees}
+
+# DataTable filter operators (filter_action='custom'), longest first so '>=' is not read as '>'
+OPERATORS = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+# Operators matching the text shown in the table, their values are never read as numbers
+TEXT_OPERATORS = ('contains', 'datestartswith')
+
+
+# Split one part of a DataTable filter query into (column, operator, value); unquoted values of the
+# comparison operators are numbers when they parse as one, the text operators keep them as typed
+def split_filter_part(filter_part):
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 == value_part[-1:] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                elif operator_type[0].strip() in TEXT_OPERATORS:
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+
+def _as_numbers(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return pd.to_numeric(column.astype(str).str.replace(',', '', regex=False), errors='coerce')
+
+
+# Column as the table shows it
+def _as_text(column):
+    if column.name in DISPLAY_FORMATS:
+        return column.map(DISPLAY_FORMATS[column.name])
+    return column.astype(str)
+
+
+def _sort_key(column):
+    if column.name in NUMERIC_COLUMNS:
+        return _as_numbers(column)
+    return _as_text(column)
+
+
+# Rows of the frame for a DataTable, with the display formats applied
+def page_records(df):
+    records = df.to_dict('records')
+    for col, format_value in DISPLAY_FORMATS.items():
+        if col in df.columns:
+            for record in records:
+                record[col] = format_value(record[col])
+    return records
+
+
+def _filter(df, filter_query):
+    for filter_part in filter_query.split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            if isinstance(filter_value, float):
+                column = _as_numbers(column)
+            else:
+                column = _as_text(column)
+            df = df.loc[getattr(column, operator)(filter_value)]
+        elif operator == 'contains':
+            df = df.loc[_as_text(column).str.contains(filter_value, case=False, regex=False)]
+        elif operator == 'datestartswith':
+            df = df.loc[_as_text(column).str.startswith(filter_value)]
+    return df
+
+
+# One page of the table (filtered and sorted on the server), with the number of pages
+@timed('table_query')
+def query_table(df, page_current, page_size, sort_by=None, filter_query='', records=None):
+    page_current = page_current or 0
+    start = page_current * page_size
+    if not sort_by and not filter_query:
+        # Nothing to filter or sort: slice the records that were already converted
+        total = len(df)
+        page = records[start: start + page_size] if records is not None \
+            else page_records(df.iloc[start: start + page_size])
+        return page, max(math.ceil(total / page_size), 1)
+
+    if filter_query:
+        df = _filter(df, filter_query)
+    if sort_by:
+        df = df.sort_values([col['column_id'] for col in sort_by],
+                            ascending=[col['direction'] == 'asc' for col in sort_by],
+                            key=_sort_key,
+                            inplace=False)
+    return page_records(df.iloc[start: start + page_size]), max(math.ceil(len(df) / page_size), 1)
@@ -43,4 +43,56 @@ style_data_conditional_for_recomm = [
         },
         'backgroundColor': 'green'
     }
-]
\ No newline at end of file
+]
+
+style_data_conditional_for_screener = [
+    {'if': {'row_index': 'odd'},
+     'backgroundColor': 'rgb(248, 248, 248)'},
+    {
+        'if': {'column_id': 'Company Name'},
+        'textAlign': 'left'
+    }] + [
+    {
+        'if': {
+            'filter_query': f'{{{column}}} = {recommendation}',
+            'column_id': column
+        },
+        'backgroundColor': color
+    }
+    for column in ['MACD', 'Bollinger Bands', 'RSI']
+    for recommendation, color in [('Sell', 'tomato'), ('Hold', 'yellow'), ('Buy', 'green')]
+]
+
+style_data_conditional_for_backtest = [
+    {'if': {'row_index': 'odd'},
+     'backgroundColor': 'rgb(248, 248, 248)'},
+    {
+        'if': {'column_id': 'Analysis'},
+        'textAlign': 'left'
+    },
+    {
+        'if': {'filter_query': '{Return} < 0', 'column_id': 'Return'},
+        'color': 'tomato'
+    },
+    {
+        'if': {'filter_query': '{Analysis} = "Buy & Hold"'},
+        'fontStyle': 'italic'
+    }
+]
+
+style_data_conditional_for_peers = [
+    {'if': {'row_index': 'odd'},
+     'backgroundColor': 'rgb(248, 248, 248)'},
+    {
+        'if': {'column_id': 'Industry'},
+        'textAlign': 'left'
+    },
+    {
+        'if': {'filter_query': '{Relative Performance} < 0', 'column_id': 'Relative Performance'},
+        'color': 'tomato'
+    },
+    {
+        'if': {'filter_query': '{Relative Performance} > 0', 'column_id': 'Relative Performance'},
+        'color': 'green'
+    }
+]
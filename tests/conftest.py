@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The app modules are flat in src/ and read their config at import: data in a temporary folder, no upstream
+os.environ.setdefault('NAYA_DATA_DIR', tempfile.mkdtemp(prefix='naya-test-'))
+os.environ.setdefault('PRICE_PROVIDER', 'synthetic')
+os.environ.setdefault('PREFETCH_ENABLED', '0')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from backtest import BACKTEST_COLUMNS, backtest_records
+from price_providers import SyntheticProvider
+
+
+@pytest.mark.parametrize('days', [0, 1])
+def test_backtest_records_without_two_days(days):
+    close = SyntheticProvider(years=1).fetch('SHORT')['Close'].to_numpy()[:days]
+    assert backtest_records(close) == []
+
+
+def test_backtest_records_of_short_history():
+    close = SyntheticProvider(years=1).fetch('SHORT')['Close'].to_numpy()[:2]
+    records = backtest_records(close)
+    assert records[-1] == {'Analysis': 'Buy & Hold', 'Return': round(float(close[-1] / close[0] - 1), 4)}
+    assert all(set(record) <= set(BACKTEST_COLUMNS) for record in records)
+    assert not any(isinstance(value, float) and np.isnan(value) for record in records for value in record.values())
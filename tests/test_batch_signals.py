@@ -0,0 +1,30 @@
+import json
+
+from batch_signals import SIGNALS_FRAME_COLUMNS, done_symbols, read_signals
+
+RESULT = {'Symbol': 'SAP', 'Date': '2024-05-02', 'Last Close': 170.5,
+          'MACD': 'Buy', 'Bollinger Bands': 'Hold', 'RSI': 'Sell'}
+
+
+def test_read_signals_of_empty_file(tmp_path):
+    path = tmp_path / 'signals.ndjson'
+    path.write_text('')
+    df = read_signals(str(path))
+    assert df.empty
+    assert list(df.columns) == SIGNALS_FRAME_COLUMNS
+
+
+def test_read_signals_skips_partial_line_and_failures(tmp_path):
+    path = tmp_path / 'signals.ndjson'
+    lines = [json.dumps(RESULT), json.dumps({'Symbol': 'BMW', 'Error': 'UpstreamError: down'}),
+             json.dumps(dict(RESULT, Symbol='ADS'))[:25]]
+    path.write_text('\n'.join(lines))
+    df = read_signals(str(path))
+    assert df.to_dict('records') == [RESULT]
+    assert done_symbols(str(path)) == {'SAP'}
+
+
+def test_read_signals_keeps_latest_result(tmp_path):
+    path = tmp_path / 'signals.ndjson'
+    path.write_text(json.dumps(RESULT) + '\n' + json.dumps(dict(RESULT, RSI='Hold')) + '\n')
+    assert read_signals(str(path))['RSI'].tolist() == ['Hold']
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+import price_store
+from price_arrays import PRICE_COLUMNS
+from price_store import _frame_to_arrays, _read, _stored_arrays, _symbol_path, _was_adjusted, _write
+
+
+def _bars(closes, first_day=19000):
+    return {'Date': np.arange(first_day, first_day + len(closes)), 'Close': np.array(closes, dtype=np.float64)}
+
+
+def test_was_adjusted():
+    old = _bars([10, 11, 12, 13])
+    assert not _was_adjusted(old, _bars([11, 12, 13, 14], first_day=19001))
+    # The last stored bar may have been intraday
+    assert not _was_adjusted(old, _bars([12, 13.5, 14], first_day=19002))
+    # 1:2 split
+    assert _was_adjusted(old, _bars([6, 6.5, 7], first_day=19002))
+    assert not _was_adjusted(old, _bars([], first_day=19004))
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+    fetch = price_store._fetch
+
+    def spy(symbol, start=None):
+        calls.append(start)
+        return fetch(symbol, start=start)
+    monkeypatch.setattr(price_store, '_fetch', spy)
+    return calls
+
+
+def _upstream(symbol):
+    return _frame_to_arrays(price_store.get_provider().fetch(symbol).dropna(subset=['Close']))
+
+
+# Stored bars changed by edit, stale so the next read refreshes them
+def _store_stale(symbol, edit):
+    _stored_arrays(symbol, max_age=60)
+    stored = _read(_symbol_path(symbol))
+    edit(stored)
+    stored['fetched_at'] = np.array(0.0)
+    _write(_symbol_path(symbol), stored)
+
+
+def test_refresh_appends_new_bars(fetches):
+    _store_stale('INCR', lambda stored: stored.update({col: stored[col][:-3] for col in ['Date'] + PRICE_COLUMNS}))
+    arrays = _stored_arrays('INCR', max_age=60)
+    assert len(fetches) == 2 and fetches[0] is None and fetches[1] is not None
+    np.testing.assert_array_equal(arrays['Date'], _upstream('INCR')['Date'])
+    np.testing.assert_allclose(arrays['Close'], _upstream('INCR')['Close'])
+
+
+def test_refresh_replaces_adjusted_history(fetches):
+    # The stored bars predate a 1:4 split that the provider applied to its whole history
+    _store_stale('ADJ', lambda stored: stored.update(Close=stored['Close'] * 4))
+    arrays = _stored_arrays('ADJ', max_age=60)
+    assert len(fetches) == 3 and fetches[1] is not None and fetches[2] is None
+    np.testing.assert_allclose(arrays['Close'], _upstream('ADJ')['Close'])
+    np.testing.assert_allclose(_read(_symbol_path('ADJ'))['Close'], _upstream('ADJ')['Close'])
+
+
+def test_failure_marker_expires(monkeypatch):
+    price_store._mark_failed('DOWN')
+    marker = _symbol_path('DOWN') + price_store.FAILURE_SUFFIX
+    assert price_store._failed_recently('DOWN')
+    monkeypatch.setattr(price_store, 'UPSTREAM_FAILURE_TTL', 0)
+    assert not price_store._failed_recently('DOWN')
+    assert not os.path.exists(marker)
+
+    price_store._mark_failed('GONE')
+    price_store._evict(None)
+    assert not os.path.exists(_symbol_path('GONE') + price_store.FAILURE_SUFFIX)
+
+
+def test_locks_outside_the_store():
+    _stored_arrays('LOCKED', max_age=60)
+    assert not [name for name in os.listdir(price_store.PRICE_STORE_DIR) if name.endswith('.lock')]
+    assert len(os.listdir(price_store.PRICE_LOCK_DIR)) <= price_store.PRICE_LOCK_SLOTS
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from analysis_func import latest_signals
+from price_providers import SyntheticProvider
+from streaming_indicators import IncrementalIndicators, update_symbol_state
+
+
+def _history(symbol='LIVE'):
+    return SyntheticProvider(years=2).fetch(symbol)
+
+
+@pytest.mark.parametrize('symbol', ['LIVE', 'SAP', 'AAPL'])
+def test_incremental_signals_match_batch(symbol):
+    history = _history(symbol)
+    indicators = IncrementalIndicators.from_history(history.iloc[:300])
+    for day in range(300, len(history)):
+        bar = history.iloc[day: day + 1]
+        indicators.update_many(bar.index.values.astype('datetime64[D]').astype(np.int64), bar['Close'].to_numpy())
+    assert indicators.signals() == latest_signals(history['Close'].to_numpy())
+
+
+def test_intraday_bar_is_replaced():
+    history = _history()
+    intraday = history.iloc[:-1].copy()
+    intraday.iloc[-1, intraday.columns.get_loc('Close')] *= 1.01
+    update_symbol_state('INTRADAY', intraday)
+    state = update_symbol_state('INTRADAY', history)
+    assert state.signals() == latest_signals(history['Close'].to_numpy())
+
+
+def test_state_rebuilt_after_split():
+    history = _history('SPLIT')
+    update_symbol_state('SPLIT', history.iloc[:-5])
+    # 1:4 split: the provider adjusts every earlier bar
+    adjusted = history.copy()
+    adjusted[['Open', 'High', 'Low', 'Close']] /= 4
+    state = update_symbol_state('SPLIT', adjusted)
+    assert state.signals() == latest_signals(adjusted['Close'].to_numpy())
+    assert np.isclose(state.last_close, adjusted['Close'].iloc[-1])
+
+
+def test_empty_history():
+    assert update_symbol_state('EMPTY', _history().iloc[:0]).signals() == {}
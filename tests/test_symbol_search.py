@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from symbol_search import SymbolSearch
+
+
+@pytest.fixture
+def search():
+    return SymbolSearch(pd.DataFrame({
+        'Symbol': ['AMZN', 'AMD', 'AZN', 'GOOGL', 'MSFT', 'AMGN', 'TXN', 'AZN'],
+        'Company Name': ['Amazon.com Inc.', 'Advanced Micro Devices Inc.', 'AstraZeneca PLC', 'Alphabet Inc.',
+                         'Microsoft Corporation', 'Amgen Inc.', 'Texas Instruments Inc.', 'AstraZeneca plc (ADR)']}))
+
+
+def _symbols(results):
+    return [symbol for symbol, _ in results]
+
+
+def test_symbol_prefix_first(search):
+    assert _symbols(search.search('am')) == ['AMD', 'AMGN', 'AMZN']
+    assert _symbols(search.search('al')) == ['GOOGL']
+
+
+def test_name_prefix_then_word_prefix(search):
+    assert _symbols(search.search('micro')) == ['MSFT', 'AMD']
+    assert _symbols(search.search('instr')) == ['TXN']
+
+
+def test_substring(search):
+    assert _symbols(search.search('zeneca')) == ['AZN']
+    assert _symbols(search.search('soft')) == ['MSFT']
+
+
+def test_typo(search):
+    assert _symbols(search.search('amazom'))[0] == 'AMZN'
+    assert _symbols(search.search('microsfot'))[0] == 'MSFT'
+
+
+def test_limit_and_duplicates(search):
+    assert _symbols(search.search('a', limit=2)) == ['AMD', 'AMGN']
+    assert search.search('azn') == [('AZN', 'AstraZeneca PLC')]
+    assert search.search('  ') == []
+
+
+def test_option(search):
+    assert search.option('AZN') == {'label': 'AZN - AstraZeneca PLC', 'value': 'AZN'}
+    assert search.option('AZN', 'AstraZeneca plc (ADR)')['label'] == 'AZN - AstraZeneca plc (ADR)'
+    assert search.option('NEW') == {'label': 'NEW', 'value': 'NEW'}
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from table_query import query_table, split_filter_part
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'Symbol': ['AAPL', 'SAP', 'BMW', 'ALV'],
+                         'Company Name': ['Apple', 'SAP', 'BMW', 'Allianz'],
+                         'Year of Founded': [1976, 1972, 1916, 1890],
+                         '#Employees': [164000, 107415, 149475, 157000],
+                         'Date': ['2024-01-02', '2023-12-29', '2024-01-03', '2023-11-30']})
+
+
+def _symbols(df, filter_query):
+    records, _ = query_table(df, 0, 10, filter_query=filter_query)
+    return [record['Symbol'] for record in records]
+
+
+def test_split_keeps_text_for_text_operators():
+    assert split_filter_part('{Year of Founded} contains 1924') == ('Year of Founded', 'contains', '1924')
+    assert split_filter_part('{Date} datestartswith 2024') == ('Date', 'datestartswith', '2024')
+    assert split_filter_part('{Year of Founded} = 1924') == ('Year of Founded', 'eq', 1924.0)
+    assert split_filter_part('{Symbol} = "SAP"') == ('Symbol', 'eq', 'SAP')
+
+
+@pytest.mark.parametrize('filter_query, expected', [
+    ('{Year of Founded} = 1972', ['SAP']),
+    ('{Year of Founded} != 1972', ['AAPL', 'BMW', 'ALV']),
+    ('{Year of Founded} < 1916', ['ALV']),
+    ('{Year of Founded} <= 1916', ['BMW', 'ALV']),
+    ('{Year of Founded} > 1972', ['AAPL']),
+    ('{Year of Founded} >= 1972', ['AAPL', 'SAP']),
+    ('{Year of Founded} contains 197', ['AAPL', 'SAP']),
+    ('{#Employees} contains 157', ['ALV']),
+    ('{#Employees} contains 107,4', ['SAP']),
+    ('{Company Name} contains all', ['ALV']),
+    ('{Date} datestartswith 2024', ['AAPL', 'BMW']),
+    ('{Symbol} = "SAP"', ['SAP']),
+    ('{Year of Founded} > 1900 && {Company Name} contains a', ['AAPL', 'SAP']),
+])
+def test_filter_operators(df, filter_query, expected):
+    assert _symbols(df, filter_query) == expected
+
+
+def test_sort_numeric_and_display_format(df):
+    records, pages = query_table(df, 0, 2, sort_by=[{'column_id': '#Employees', 'direction': 'desc'}])
+    assert [record['Symbol'] for record in records] == ['AAPL', 'ALV']
+    assert records[0]['#Employees'] == '164,000'
+    assert pages == 2